@@ -2,40 +2,10 @@
 
 import sqlite3
 from datetime import datetime
+from habit_tracker import setup_database
 
 DB_NAME = 'habits.db'
 
-def setup_database():
-    """
-    Creates the 'habits' and 'completions' tables in the database if they do not exist.
-    The 'habits' table stores information about each habit, while the 'completions'
-    table tracks each completion record with date and time.
-    """
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        
-        # Create 'habits' table with columns for habit name, frequency, creation date, and streak
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS habits (
-                name TEXT PRIMARY KEY,
-                periodicity TEXT,
-                created_at TEXT,
-                streak INTEGER
-            )
-        """)
-        
-        # Create 'completions' table with date and time columns for each habit completion record
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS completions (
-                habit_name TEXT,
-                date TEXT,
-                time TEXT,
-                PRIMARY KEY (habit_name, date),
-                FOREIGN KEY (habit_name) REFERENCES habits (name)
-            )
-        """)
-        conn.commit()
-
 def add_predefined_habits():
     """
     Adds five predefined habits to the 'habits' table in the database.
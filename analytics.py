@@ -1,10 +1,16 @@
 # analytics.py
 
-import sqlite3
-from datetime import datetime, timedelta
+from datetime import datetime
 
-DB_NAME = 'habits.db'
+import metrics
+from db import get_connection
+from habit_tracker import Completion
 
+QUERY_SECONDS = metrics.register(metrics.Histogram(
+    "habit_analytics_query_seconds", "Time taken by each analytics query, including fetching its rows.",
+    labels=("query",)))
+
+@QUERY_SECONDS.time(query="get_all_habits")
 def get_all_habits():
     """
     Retrieves all habits from the database.
@@ -12,45 +18,41 @@ def get_all_habits():
     Returns:
         list of tuple: Each tuple contains habit details (name, periodicity, created_at, streak).
     """
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT name, periodicity, created_at, streak FROM habits")
-        return cursor.fetchall()
+    cursor = get_connection().cursor()
+    cursor.execute("SELECT name, periodicity, created_at, streak FROM habits")
+    return cursor.fetchall()
 
+@QUERY_SECONDS.time(query="get_incomplete_habits_for_today")
 def get_incomplete_habits_for_today():
     """
     Retrieves all daily habits not completed today and weekly habits not completed within the last 7 days.
+    Runs as a single anti-join in which every habit costs one seek into the (habit_id, day)
+    primary key of 'completion_days', so the time taken does not grow with the completion history.
     
     Returns:
-        list of tuple: List of tuples representing incomplete habits with their details.
+        list of tuple: List of tuples representing incomplete habits with their details,
+            daily habits first.
     """
-    today_date = datetime.now().date().isoformat()
-    seven_days_ago = (datetime.now().date() - timedelta(days=7)).isoformat()
-
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-
-        # Retrieve incomplete daily habits
-        cursor.execute("""
-            SELECT name, periodicity, created_at, streak
-            FROM habits
-            WHERE periodicity = 'daily' 
-            AND name NOT IN (SELECT habit_name FROM completions WHERE date = ?)
-        """, (today_date,))
-        incomplete_daily = cursor.fetchall()
-
-        # Retrieve incomplete weekly habits
-        cursor.execute("""
-            SELECT name, periodicity, created_at, streak
-            FROM habits
-            WHERE periodicity = 'weekly'
-            AND name NOT IN (SELECT habit_name FROM completions WHERE date >= ?)
-        """, (seven_days_ago,))
-        incomplete_weekly = cursor.fetchall()
-
-        # Combine and return both lists
-        return incomplete_daily + incomplete_weekly
-
+    today = datetime.now().date().toordinal()
+    seven_days_ago = today - 7
+
+    cursor = get_connection().cursor()
+    cursor.execute("""
+        SELECT h.name, h.periodicity, h.created_at, h.streak
+        FROM habits h
+        WHERE h.periodicity IN ('daily', 'weekly')
+        AND NOT EXISTS (
+            SELECT 1
+            FROM completion_days c
+            WHERE c.habit_id = h.id
+            AND c.day >= CASE h.periodicity WHEN 'daily' THEN :today ELSE :seven_days_ago END
+            AND (h.periodicity = 'weekly' OR c.day = :today)
+        )
+        ORDER BY h.periodicity = 'weekly', h.id
+    """, {"today": today, "seven_days_ago": seven_days_ago})
+    return cursor.fetchall()
+
+@QUERY_SECONDS.time(query="get_habits_by_periodicity")
 def get_habits_by_periodicity(periodicity):
     """
     Retrieves habits by their periodicity type.
@@ -61,36 +63,78 @@ def get_habits_by_periodicity(periodicity):
     Returns:
         list of tuple: List of tuples representing habits matching the specified periodicity.
     """
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT name, periodicity, created_at, streak FROM habits WHERE periodicity = ?", (periodicity,))
-        return cursor.fetchall()
+    cursor = get_connection().cursor()
+    cursor.execute("SELECT name, periodicity, created_at, streak FROM habits WHERE periodicity = ?", (periodicity,))
+    return cursor.fetchall()
 
+@QUERY_SECONDS.time(query="longest_streak_all_habits")
 def longest_streak_all_habits():
     """
-    Finds the longest streak among all habits.
+    Finds the longest streak ever reached among all habits.
 
     Returns:
-        int or None: The maximum streak found in the 'habits' table, or None if no entries.
+        int or None: The maximum best streak found in the 'habits' table, or None if no entries.
     """
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT MAX(streak) FROM habits")
-        result = cursor.fetchone()
-        return result[0] if result else 0
+    cursor = get_connection().cursor()
+    cursor.execute("SELECT MAX(best_streak) FROM habits")
+    result = cursor.fetchone()
+    return result[0] if result else 0
 
+@QUERY_SECONDS.time(query="longest_streak_for_habit")
 def longest_streak_for_habit(name):
     """
-    Finds the longest streak for a specific habit.
+    Finds the longest streak ever reached for a specific habit.
+
+    Args:
+        name (str): The name of the habit.
+
+    Returns:
+        int or None: The best streak for the specified habit, or None if the habit is not found.
+    """
+    cursor = get_connection().cursor()
+    cursor.execute("SELECT best_streak FROM habits WHERE name = ?", (name,))
+    result = cursor.fetchone()
+    return result[0] if result else None
+
+@QUERY_SECONDS.time(query="get_completions")
+def get_completions(name):
+    """
+    Retrieves the completion history of a habit.
+
+    Args:
+        name (str): The name of the habit.
+
+    Returns:
+        list of Completion: The habit's completions, oldest first; empty if the habit is not found.
+    """
+    cursor = get_connection().cursor()
+    cursor.execute(
+        "SELECT habit_id, day, time FROM completion_days WHERE habit_id = (SELECT id FROM habits WHERE name = ?) ORDER BY day",
+        (name,)
+    )
+    from_row = Completion.from_row
+    return [from_row(row) for row in cursor]
+
+@QUERY_SECONDS.time(query="completion_rate")
+def completion_rate(name, days):
+    """
+    Computes the share of the last days, up to and including today, on which a habit was completed.
 
     Args:
         name (str): The name of the habit.
+        days (int): The length of the window in days.
 
     Returns:
-        int or None: The streak for the specified habit, or None if the habit is not found.
+        float or None: The rate between 0 and 1, or None if the habit is not found.
     """
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT streak FROM habits WHERE name = ?", (name,))
-        result = cursor.fetchone()
-        return result[0] if result else None
+    today = datetime.now().date().toordinal()
+    cursor = get_connection().cursor()
+    cursor.execute("""
+        SELECT (SELECT COUNT(*) FROM completion_days c WHERE c.habit_id = h.id AND c.day BETWEEN ? AND ?)
+        FROM habits h
+        WHERE h.name = ?
+    """, (today - days + 1, today, name))
+    result = cursor.fetchone()
+    if result is None:
+        return None
+    return result[0] / days if days > 0 else 0.0
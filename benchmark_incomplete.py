@@ -0,0 +1,69 @@
+# File: benchmark_incomplete.py
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import db
+from analytics import get_incomplete_habits_for_today
+from generate_data import generate
+from habit_tracker import setup_database
+
+# The two-query NOT IN form the to-do list used before the anti-join, kept as a baseline
+LEGACY_QUERIES = (
+    """
+    SELECT name, periodicity, created_at, streak FROM habits
+    WHERE periodicity = 'daily' AND id NOT IN (SELECT habit_id FROM completion_days WHERE day = ?)
+    """,
+    """
+    SELECT name, periodicity, created_at, streak FROM habits
+    WHERE periodicity = 'weekly' AND id NOT IN (SELECT habit_id FROM completion_days WHERE day >= ?)
+    """,
+)
+
+def legacy_incomplete_habits():
+    """Runs the baseline NOT IN queries and returns their combined rows."""
+    today = datetime.now().date().toordinal()
+    conn = db.get_connection()
+    return (conn.execute(LEGACY_QUERIES[0], (today,)).fetchall()
+            + conn.execute(LEGACY_QUERIES[1], (today - 7,)).fetchall())
+
+def best_time(function, repeat):
+    """
+    Returns the best wall-clock time of several calls, in seconds.
+
+    Args:
+        function (callable): The function to time.
+        repeat (int): How many calls to make.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    """Times the incomplete-habits query against growing completion histories."""
+    parser = argparse.ArgumentParser(description="Benchmark the incomplete-habits query as history grows.")
+    parser.add_argument("--habits", type=int, default=1000, help="number of habits")
+    parser.add_argument("--days", default="30,365,3650", help="comma-separated history lengths to test")
+    parser.add_argument("--repeat", type=int, default=5, help="calls per measurement")
+    args = parser.parse_args()
+
+    print(f"{'completions':>12} {'anti-join':>12} {'NOT IN':>12}")
+    for days in (int(value) for value in args.days.split(",")):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db.DB_NAME = os.path.join(tmpdir, "benchmark.db")
+            setup_database()
+            completions = generate(db.DB_NAME, args.habits, days, rate=0.8, seed=42)
+            assert sorted(get_incomplete_habits_for_today()) == sorted(legacy_incomplete_habits())
+            current = best_time(get_incomplete_habits_for_today, args.repeat)
+            legacy = best_time(legacy_incomplete_habits, args.repeat)
+            print(f"{completions:>12} {current * 1000:>10.2f}ms {legacy * 1000:>10.2f}ms")
+            db.close_all()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# File: benchmark_streaks.py
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import db
+from generate_data import generate
+from habit_tracker import Habit, setup_database
+
+def time_engine(engine, repeat):
+    """
+    Times full streak recomputes with one engine.
+
+    Args:
+        engine (str): The engine name accepted by Habit.update_all_streaks.
+        repeat (int): How many recomputes to run.
+
+    Returns:
+        float: The best wall-clock time of a single recompute, in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        Habit.update_all_streaks(engine=engine, full=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    """Builds a synthetic database and compares the streak engines on it."""
+    parser = argparse.ArgumentParser(description="Benchmark the streak recompute engines.")
+    parser.add_argument("--habits", type=int, default=2000, help="number of habits")
+    parser.add_argument("--days", type=int, default=365, help="days of history per habit")
+    parser.add_argument("--rate", type=float, default=0.8, help="completion probability per period")
+    parser.add_argument("--repeat", type=int, default=3, help="recomputes per engine")
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+    parser.add_argument("--engines", default="python,sql,numpy,bitmap", help="comma-separated engines to time")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db.DB_NAME = os.path.join(tmpdir, "benchmark.db")
+        setup_database()
+        completions = generate(db.DB_NAME, args.habits, args.days, rate=args.rate, seed=args.seed)
+        print(f"{args.habits} habits, {completions} completions")
+
+        results = {}
+        for engine in args.engines.split(","):
+            seconds = time_engine(engine, args.repeat)
+            with sqlite3.connect(db.DB_NAME) as conn:
+                results[engine] = conn.execute(
+                    "SELECT name, streak, run_start, run_end, run_length, best_streak FROM habits ORDER BY name"
+                ).fetchall()
+            print(f"{engine:>8}: {seconds * 1000:10.1f} ms")
+
+        reference = next(iter(results.values()))
+        for engine, state in results.items():
+            if state != reference:
+                print(f"WARNING: engine '{engine}' disagrees with the other engines")
+        db.close_all()
+
+if __name__ == '__main__':
+    main()
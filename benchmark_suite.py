@@ -0,0 +1,276 @@
+# File: benchmark_suite.py
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import analytics
+import db
+from generate_data import generate
+from habit_tracker import Completion, Habit, setup_database
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# End-to-end commands, run as separate processes against the benchmark database
+CLI_CASES = [
+    ("cli.py", ["check-today", "Habit 0"]),
+    ("cli.py", ["list-incomplete"]),
+    ("cli.py", ["longest-streak"]),
+    ("fastcli.py", ["check-today", "Habit 0"]),
+    ("fastcli.py", ["complete", "Habit 2"]),
+]
+
+# Records built and kept alive before each memory measurement. CPython reuses freed tuples,
+# dicts and small objects from free lists allocated before tracemalloc starts, which would
+# make the first records look free; this many absorbs those lists.
+WARMUP_OBJECTS = 10000
+
+def measure(function, repeat):
+    """
+    Calls a function several times and records the wall-clock time of each call.
+
+    Args:
+        function (callable): The function to time.
+        repeat (int): How many calls to make.
+
+    Returns:
+        list of float: The duration of every call, in seconds.
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def engines():
+    """Returns the streak engines that can run here; numpy is optional."""
+    available = ["python", "sql", "bitmap"]
+    if importlib.util.find_spec("numpy") is not None:
+        available.append("numpy")
+    return available
+
+def library_cases():
+    """
+    Returns the in-process cases as (name, function) pairs: the single-habit and full
+    streak recomputes, and every analytics query.
+    """
+    cases = [("Habit.update_streak", Habit("Habit 0", "daily").update_streak)]
+    for engine in engines():
+        cases.append((f"Habit.update_all_streaks[{engine}]",
+                      lambda engine=engine: Habit.update_all_streaks(engine=engine, full=True)))
+    cases += [
+        ("analytics.get_all_habits", analytics.get_all_habits),
+        ("analytics.get_incomplete_habits_for_today", analytics.get_incomplete_habits_for_today),
+        ("analytics.get_habits_by_periodicity", lambda: analytics.get_habits_by_periodicity("daily")),
+        ("analytics.longest_streak_all_habits", analytics.longest_streak_all_habits),
+        ("analytics.longest_streak_for_habit", lambda: analytics.longest_streak_for_habit("Habit 0")),
+        ("analytics.get_completions", lambda: analytics.get_completions("Habit 0")),
+        ("analytics.completion_rate", lambda: analytics.completion_rate("Habit 0", 30)),
+    ]
+    return cases
+
+class DictHabit(Habit):
+    """Habit with a per-instance __dict__, as it was before __slots__; the memory baseline."""
+
+class DictCompletion(Completion):
+    """Completion with a per-instance __dict__; the memory baseline."""
+
+def memory_cases(count):
+    """
+    Returns the record types to measure as (name, factory, rows) triples, with count rows
+    shaped like the ones read from the database.
+    """
+    habit_rows = [(f"Habit {i}", "daily" if i % 2 else "weekly", "2024-01-01 08:00:00", i % 30, i % 60)
+                  for i in range(count)]
+    completion_rows = [(i % 1000, 738000 + i // 1000, "08:00:00") for i in range(count)]
+    return [
+        ("Habit", Habit.from_row, habit_rows),
+        ("Habit with __dict__", DictHabit.from_row, habit_rows),
+        ("Completion", Completion.from_row, completion_rows),
+        ("Completion with __dict__", DictCompletion.from_row, completion_rows),
+        ("Completion as tuple", lambda row: (row[0], row[1], row[2]), completion_rows),
+    ]
+
+def bytes_per_object(factory, rows):
+    """
+    Measures the memory each record built from a row holds on to, with tracemalloc.
+
+    Args:
+        factory (callable): Builds one record from one row.
+        rows (list): The rows to build records from; already allocated, so memory they
+            share with the records is not counted.
+
+    Returns:
+        float: Bytes allocated per record, not counting the list holding them.
+    """
+    records = [None] * len(rows)
+    warmup = [factory(rows[index % len(rows)]) for index in range(WARMUP_OBJECTS)]
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for index, row in enumerate(rows):
+            records[index] = factory(row)
+        allocated = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del warmup
+    return allocated / len(rows)
+
+def run_memory(count):
+    """
+    Measures the memory per object of the in-memory record types.
+
+    Args:
+        count (int): How many records of each type to build.
+
+    Returns:
+        list of dict: One result per record type.
+    """
+    print(f"Memory per object, {count} objects each:")
+    results = []
+    for name, factory, rows in memory_cases(count):
+        size = bytes_per_object(factory, rows)
+        results.append({"record": name, "objects": count, "bytes_per_object": size})
+        print(f"  {name:<48} {size:10.1f} B")
+    return results
+
+def cli_case(script, args, workdir):
+    """
+    Returns a function that runs one CLI command in a new process inside workdir, where
+    the benchmark database is the habits.db the command opens.
+
+    Args:
+        script (str): The entry point to run, cli.py or fastcli.py.
+        args (list): The command line after the script.
+        workdir (str): The directory holding the benchmark database.
+    """
+    command = [sys.executable, os.path.join(HERE, script), *args]
+
+    def run():
+        subprocess.run(command, cwd=workdir, check=True, capture_output=True)
+    return run
+
+def run_size(habits, days, rate, seed, repeat, include_cli):
+    """
+    Builds one synthetic database and times every case on it.
+
+    Args:
+        habits (int): Number of habits to create.
+        days (int): Length of the completion history in days.
+        rate (float): Probability that a habit is completed in a given period.
+        seed (int): Seed for the random generator.
+        repeat (int): How many times each case runs.
+        include_cli (bool): Also time the end-to-end CLI commands.
+
+    Returns:
+        list of dict: One result per case.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        db.DB_NAME = os.path.join(workdir, "habits.db")
+        setup_database()
+        start = time.perf_counter()
+        completions = generate(db.DB_NAME, habits, days, rate=rate, seed=seed)
+        print(f"{habits} habits x {days} days: {completions} completions "
+              f"generated in {time.perf_counter() - start:.1f} s")
+        Habit.update_all_streaks(full=True)
+
+        cases = library_cases()
+        if include_cli:
+            cases += [(f"{script} {' '.join(args)}", cli_case(script, args, workdir)) for script, args in CLI_CASES]
+        for name, function in cases:
+            samples = measure(function, repeat)
+            results.append({
+                "case": name,
+                "habits": habits,
+                "days": days,
+                "completions": completions,
+                "best_s": min(samples),
+                "median_s": statistics.median(samples),
+                "repeat": repeat,
+            })
+            print(f"  {name:<48} {min(samples) * 1000:10.2f} ms")
+        db.close_all()
+    return results
+
+def compare(results, baseline_path, threshold):
+    """
+    Compares best times with a previous results file and reports regressions.
+
+    Args:
+        results (list of dict): The results of this run.
+        baseline_path (str): Path of a JSON file written by an earlier run.
+        threshold (float): Ratio of new to old best time above which a case regressed.
+
+    Returns:
+        int: The number of regressed cases.
+    """
+    with open(baseline_path) as file:
+        baseline = {(r["case"], r["habits"], r["days"]): r["best_s"] for r in json.load(file)["results"]}
+
+    regressions = 0
+    print(f"\nCompared with {baseline_path}:")
+    for result in results:
+        old = baseline.get((result["case"], result["habits"], result["days"]))
+        if old is None or old == 0:
+            continue
+        ratio = result["best_s"] / old
+        flag = ""
+        if ratio > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"  {result['case']:<48} {result['habits']:>8}x{result['days']:<6} {ratio:6.2f}x{flag}")
+    return regressions
+
+def main():
+    """Runs the benchmark suite over the requested database sizes and saves the results as JSON."""
+    parser = argparse.ArgumentParser(description="Benchmark streaks, analytics and CLI commands on synthetic data.")
+    parser.add_argument("--sizes", default="1000x365,10000x365",
+                        help="comma-separated HABITSxDAYS database sizes, e.g. 1000000x100 for 1M habits")
+    parser.add_argument("--rate", type=float, default=0.8, help="completion probability per period")
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+    parser.add_argument("--repeat", type=int, default=5, help="calls per case")
+    parser.add_argument("--no-cli", action="store_true", help="skip the end-to-end CLI commands")
+    parser.add_argument("--memory-objects", type=int, default=100000,
+                        help="records built per type when measuring memory per object; 0 skips it")
+    parser.add_argument("--output", default="benchmark_results.json", help="file to write the results to")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="slowdown ratio reported as a regression when comparing")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes.split(","):
+        habits, days = (int(value) for value in size.lower().split("x"))
+        results += run_size(habits, days, args.rate, args.seed, args.repeat, not args.no_cli)
+    memory = run_memory(args.memory_objects) if args.memory_objects > 0 else []
+
+    with open(args.output, "w") as file:
+        json.dump({
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "rate": args.rate,
+            "seed": args.seed,
+            "results": results,
+            "memory": memory,
+        }, file, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline and compare(results, args.baseline, args.threshold):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
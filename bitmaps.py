@@ -0,0 +1,262 @@
+# File: bitmaps.py
+
+import os
+import zlib
+from datetime import datetime
+
+from habit_tracker import EMPTY_RUN, current_streak, period_index
+from streaks_sql import STALE_HABITS_CONDITION
+
+# Set HABIT_BITMAPS=1 to answer completion checks from per-habit completion bitmaps
+ENABLED = os.environ.get("HABIT_BITMAPS", "0") == "1"
+
+_popcount = getattr(int, "bit_count", lambda value: bin(value).count("1"))
+
+def _mask(length):
+    return (1 << length) - 1
+
+def _trailing_run(bits):
+    """Returns the number of consecutive set bits ending at the highest set bit."""
+    length = bits.bit_length()
+    return length - (~bits & _mask(length)).bit_length()
+
+def _longest_run(bits):
+    """Returns the length of the longest run of consecutive set bits."""
+    longest = 0
+    while bits:
+        # Every pass shortens each run by one bit
+        bits &= bits >> 1
+        longest += 1
+    return longest
+
+class CompletionBitmap:
+    """
+    The completion history of one habit as a bitmap: bit i is set if the habit was
+    completed on day first_day + i, so bits above the last completion are never stored.
+
+    Attributes:
+        first_day (int or None): Day ordinal of bit 0, the earliest completion.
+        bits (int): The bitmap; 0 for a habit without completions.
+    """
+
+    __slots__ = ("first_day", "bits")
+
+    def __init__(self, first_day=None, bits=0):
+        self.first_day = first_day
+        self.bits = bits
+
+    @classmethod
+    def from_days(cls, days):
+        """
+        Builds a bitmap from completion day ordinals.
+
+        Args:
+            days (iterable of int): The days the habit was completed on, in any order.
+        """
+        days = list(days)
+        if not days:
+            return cls()
+        first_day = min(days)
+        bits = 0
+        for day in days:
+            bits |= 1 << (day - first_day)
+        return cls(first_day, bits)
+
+    @classmethod
+    def from_blob(cls, first_day, blob, compressed):
+        """Restores a bitmap stored by to_blob."""
+        if compressed:
+            blob = zlib.decompress(blob)
+        return cls(first_day, int.from_bytes(blob, "little"))
+
+    def to_blob(self):
+        """
+        Serializes the bitmap for the 'completion_bitmaps' table.
+
+        Returns:
+            tuple: (blob, compressed). The little-endian bytes of the bitmap, zlib-compressed
+                when that makes them smaller, as for long histories with regular gaps.
+        """
+        raw = self.bits.to_bytes((self.bits.bit_length() + 7) // 8, "little")
+        packed = zlib.compress(raw, 9)
+        if len(packed) < len(raw):
+            return packed, True
+        return raw, False
+
+    @property
+    def last_day(self):
+        """Day ordinal of the latest completion, or None without completions."""
+        if not self.bits:
+            return None
+        return self.first_day + self.bits.bit_length() - 1
+
+    def add(self, day):
+        """Sets the bit for a completion day, moving first_day back if the day is earlier."""
+        if not self.bits:
+            self.first_day, self.bits = day, 1
+        elif day < self.first_day:
+            self.bits = (self.bits << (self.first_day - day)) | 1
+            self.first_day = day
+        else:
+            self.bits |= 1 << (day - self.first_day)
+
+    def has(self, day):
+        """Checks if the habit was completed on a day."""
+        return bool(self.bits) and day >= self.first_day and bool(self.bits >> (day - self.first_day) & 1)
+
+    def count_between(self, start, end):
+        """
+        Counts the completions between two days, both included.
+
+        Args:
+            start (int): Day ordinal of the first day of the window.
+            end (int): Day ordinal of the last day of the window.
+        """
+        if not self.bits or end < start:
+            return 0
+        if start < self.first_day:
+            if end < self.first_day:
+                return 0
+            start = self.first_day
+        return _popcount(self.bits >> (start - self.first_day) & _mask(end - start + 1))
+
+    def completion_rate(self, days, today):
+        """
+        Returns the share of the last days, up to and including today, with a completion.
+
+        Args:
+            days (int): The length of the window in days.
+            today (int): Day ordinal of the current date.
+        """
+        return self.count_between(today - days + 1, today) / days if days > 0 else 0.0
+
+    def days(self):
+        """Yields the completion day ordinals, oldest first."""
+        bits = self.bits
+        while bits:
+            lowest = bits & -bits
+            yield self.first_day + lowest.bit_length() - 1
+            bits ^= lowest
+
+    def run_state(self, periodicity):
+        """
+        Computes the streak state Habit.update_streak would fold from the same completions.
+
+        Args:
+            periodicity (str): The frequency of the habit ('daily' or 'weekly').
+
+        Returns:
+            tuple: (run_start, run_end, run_length, best_streak).
+        """
+        if not self.bits:
+            return EMPTY_RUN
+        if periodicity == "weekly":
+            # One bit per week holding at least one completion
+            first_period = period_index(self.first_day, periodicity)
+            periods = 0
+            for day in self.days():
+                periods |= 1 << (period_index(day, periodicity) - first_period)
+        else:
+            first_period, periods = self.first_day, self.bits
+
+        run_length = _trailing_run(periods)
+        start_period = first_period + periods.bit_length() - run_length
+        if periodicity == "weekly":
+            # The run starts with the first completion in its first week; ordinal 1 is a Monday
+            offset = max(start_period * 7 + 1 - self.first_day, 0)
+            rest = self.bits >> offset
+            run_start = self.first_day + offset + (rest & -rest).bit_length() - 1
+        else:
+            run_start = start_period
+        return run_start, self.last_day, run_length, _longest_run(periods)
+
+def read(conn, habit_id):
+    """
+    Reads a habit's stored bitmap.
+
+    Returns:
+        CompletionBitmap or None: The bitmap, or None if none is stored because the habit
+            has no completions or they changed since it was stored.
+    """
+    row = conn.execute(
+        "SELECT first_day, bits, compressed FROM completion_bitmaps WHERE habit_id = ?", (habit_id,)
+    ).fetchone()
+    return CompletionBitmap.from_blob(*row) if row else None
+
+def build(conn, habit_id):
+    """Builds a habit's bitmap from its rows in 'completion_days'."""
+    cursor = conn.execute("SELECT day FROM completion_days WHERE habit_id = ?", (habit_id,))
+    return CompletionBitmap.from_days(day for (day,) in cursor)
+
+def store(conn, habit_id, bitmap):
+    """
+    Stores a habit's bitmap in the caller's transaction. Bitmaps without completions are
+    not stored.
+    """
+    if bitmap.bits:
+        blob, compressed = bitmap.to_blob()
+        conn.execute(
+            "INSERT OR REPLACE INTO completion_bitmaps (habit_id, first_day, bits, compressed) VALUES (?, ?, ?, ?)",
+            (habit_id, bitmap.first_day, blob, int(compressed))
+        )
+
+def load(conn, habit_id):
+    """
+    Returns a habit's bitmap, rebuilding it from the completions if the stored one is
+    missing. Any write to a habit's completions deletes its stored bitmap, through the
+    completion_days triggers, so a stored bitmap is always current.
+
+    A rebuilt bitmap is not stored: reads must not take the write lock or bump
+    PRAGMA data_version for other connections. Write paths store it with store().
+
+    Args:
+        conn (sqlite3.Connection): The connection to read from.
+        habit_id (int): The id of the habit.
+
+    Returns:
+        CompletionBitmap: The habit's completion history.
+    """
+    bitmap = read(conn, habit_id)
+    return bitmap if bitmap is not None else build(conn, habit_id)
+
+def update_all_streaks(conn, full=False):
+    """
+    Recomputes the streak state of every stale habit from its completion bitmap, with
+    bit scans instead of a fold over every completion. Produces the same state as
+    Habit.update_streak, and stores the bitmaps it had to rebuild.
+
+    Args:
+        conn (sqlite3.Connection): The connection to read from and write to.
+        full (bool): Recompute every habit, not only the stale ones.
+
+    Returns:
+        int: The number of habits updated.
+    """
+    today = datetime.now().date()
+    updates = []
+    with conn:
+        # Bitmaps are read, rebuilt and stored under one write lock, so a completion
+        # committed by another writer in between cannot be missing from a stored bitmap
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.execute(
+            f"SELECT id, periodicity FROM habits WHERE {STALE_HABITS_CONDITION}",
+            {"full": int(full), "today_iso": today.isoformat()}
+        )
+        for habit_id, periodicity in cursor.fetchall():
+            bitmap = read(conn, habit_id)
+            if bitmap is None:
+                bitmap = build(conn, habit_id)
+                store(conn, habit_id, bitmap)
+            run_start, run_end, run_length, best_streak = bitmap.run_state(periodicity)
+            streak = current_streak(run_end, run_length, periodicity, today.toordinal())
+            updates.append((streak, today.isoformat(), run_start, run_end, run_length, best_streak, habit_id))
+
+        conn.executemany(
+            """
+            UPDATE habits
+            SET streak = ?, streak_as_of = ?, run_start = ?, run_end = ?, run_length = ?, best_streak = ?
+            WHERE id = ?
+            """,
+            updates
+        )
+    return len(updates)
@@ -0,0 +1,319 @@
+# File: check_query_plans.py
+
+import argparse
+import ast
+import contextlib
+import importlib
+import importlib.util
+import io
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+import analytics
+import bitmaps
+import clear_db
+import db
+import sql_stats
+from generate_data import generate
+from habit_tracker import Habit
+from repository import HabitRepository
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Modules whose queries must be exercised by the workload below
+MODULES = ["habit_tracker", "analytics", "bitmaps", "clear_db", "repository", "streaks_sql", "streaks_numpy"]
+
+# Tables holding the completion history; a full scan of one grows with every completion ever recorded
+COMPLETION_TABLES = {"completion_days", "completions"}
+
+# Statements that may scan the completion history, with the reason they are allowed to
+ALLOWED_SCANS = {
+    "DELETE FROM completion_days": "clear_db.py empties the whole table on purpose",
+    "DELETE FROM completions": "clear_db.py empties the legacy table on purpose",
+}
+
+# Shipped statements the workload cannot reach, with the reason
+UNREACHABLE = {
+    "DELETE FROM completions": "only runs on databases that still have the legacy completions table",
+}
+
+DML_PREFIXES = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+
+_TABLE_REFERENCE = re.compile(r"\b(?:FROM|JOIN|INTO)\s+(?:temp\.)?(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+_NOT_ALIASES = {"WHERE", "JOIN", "ON", "LEFT", "INNER", "CROSS", "NATURAL", "GROUP", "ORDER", "LIMIT",
+                "USING", "UNION", "SET", "WINDOW", "VALUES", "SELECT", "DEFAULT"}
+_NAMED_PARAMETER = re.compile(r":([A-Za-z_]\w*)")
+_TRIGGER_COLUMN = re.compile(r"\b(?:NEW|OLD)\.\w+", re.IGNORECASE)
+
+def _normalize(sql):
+    return " ".join(sql.split())
+
+def _dummy_params(sql):
+    """Returns NULL parameters for every placeholder of a statement, enough to plan it."""
+    named = _NAMED_PARAMETER.findall(sql)
+    if named:
+        return {name: None for name in named}
+    return (None,) * sql.count("?")
+
+def _table_names(sql, views):
+    """
+    Maps every table name and alias a statement refers to, including those inside the
+    views it reads, to the table it stands for.
+    """
+    names = {}
+    for table, alias in _TABLE_REFERENCE.findall(sql):
+        names[table] = table
+        if alias and alias.upper() not in _NOT_ALIASES:
+            names[alias] = table
+        if table in views:
+            names.update(_table_names(views.pop(table), views))
+    return names
+
+def completion_scans(plan, sql, views):
+    """
+    Finds the steps of a query plan that scan a completion table from start to end.
+
+    Args:
+        plan (list): Rows returned by EXPLAIN QUERY PLAN.
+        sql (str): The statement the plan belongs to.
+        views (dict): View names mapped to their definitions.
+
+    Returns:
+        list of str: The offending plan steps, empty if the statement only seeks.
+    """
+    names = _table_names(sql, dict(views))
+    scans = []
+    for _, _, _, detail in plan:
+        match = re.match(r"SCAN (\w+)", detail)
+        if match and names.get(match.group(1), match.group(1)) in COMPLETION_TABLES:
+            scans.append(detail)
+    return scans
+
+class PlanRecorder:
+    """
+    A sql_stats listener that explains every data statement the first time it runs, on
+    the pooled connection of the running thread, while the temporary tables it may use
+    still exist.
+    """
+
+    def __init__(self):
+        self.plans = {}
+
+    def __call__(self, sql, params_shape, seconds, rows):
+        if sql in self.plans or not sql.upper().startswith(DML_PREFIXES):
+            return
+        # A plain cursor, so the EXPLAIN itself is not reported back to the listener
+        cursor = sqlite3.Cursor(db.get_connection())
+        try:
+            self.plans[sql] = cursor.execute("EXPLAIN QUERY PLAN " + sql, _dummy_params(sql)).fetchall()
+        except sqlite3.Error as error:
+            self.plans[sql] = error
+        finally:
+            cursor.close()
+
+def trigger_statements(conn):
+    """
+    Yields the statements inside every trigger, with NEW/OLD column references replaced
+    by placeholders so they can be explained like ordinary statements.
+
+    Args:
+        conn (sqlite3.Connection): A connection to a database with the current schema.
+
+    Yields:
+        tuple: (trigger name, statement).
+    """
+    for name, sql in conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger' ORDER BY name"):
+        upper = sql.upper()
+        body = sql[upper.index(" BEGIN") + len(" BEGIN"):upper.rindex("END")]
+        for statement in body.split(";"):
+            if statement.strip():
+                yield name, _normalize(_TRIGGER_COLUMN.sub("?", statement))
+
+def shipped_queries():
+    """
+    Finds the data statements passed to execute() or executemany() in MODULES, reading
+    module-level constants for statements kept in variables.
+
+    Yields:
+        tuple: (source location, normalized statement, exact) where exact is False for
+            f-strings, of which only the literal text before the first field is known.
+    """
+    for module_name in MODULES:
+        if importlib.util.find_spec(module_name) is None:
+            continue
+        path = os.path.join(HERE, f"{module_name}.py")
+        with open(path) as file:
+            tree = ast.parse(file.read())
+        module = None
+        for node in ast.walk(tree):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                    and node.func.attr in ("execute", "executemany") and node.args):
+                continue
+            argument, exact = node.args[0], True
+            if isinstance(argument, ast.Constant) and isinstance(argument.value, str):
+                text = argument.value
+            elif isinstance(argument, ast.Name):
+                try:
+                    module = module or importlib.import_module(module_name)
+                except ImportError:
+                    continue
+                text = getattr(module, argument.id, None)
+                if not isinstance(text, str):
+                    continue
+            elif isinstance(argument, ast.JoinedStr):
+                text, exact = "", False
+                for value in argument.values:
+                    if not isinstance(value, ast.Constant):
+                        break
+                    text += value.value
+            else:
+                continue
+            text = _normalize(text)
+            if text.upper().startswith(DML_PREFIXES):
+                yield f"{module_name}.py:{node.lineno}", text, exact
+
+def run_workload():
+    """Calls every Habit method, streak engine, analytics query and clear_db on synthetic data."""
+    now = datetime.now()
+    generate(db.DB_NAME, 20, days=60, seed=1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        Habit.update_all_streaks(engine="python", full=True)
+
+        habit = Habit("Habit 0", "daily")
+        habit.exists_in_db()
+        habit.is_completed_within_7_days()
+        habit.complete_task(date=now + timedelta(days=1))
+        habit.is_completed_today()
+        habit.update_streak()
+
+        weekly = Habit("Query plan check", "weekly")
+        weekly.save()
+        weekly.complete_task()
+        weekly.complete_task(date=now - timedelta(days=14))
+        Habit("Missing habit", "daily").complete_task()
+        Habit.complete_many([
+            ("Habit 1", None, None),
+            ("Query plan check", (now - timedelta(days=3)).date().isoformat(), None),
+            ("Missing habit", None, None),
+        ])
+
+        # An ongoing streak last checked yesterday sends update_all_streaks down its lapse path
+        with db.get_connection() as conn:
+            conn.execute("UPDATE habits SET streak_as_of = ? WHERE name = ?",
+                         ((now - timedelta(days=1)).date().isoformat(), "Habit 0"))
+        Habit.update_all_streaks(engine="python")
+
+        engines = ["python", "sql", "bitmap"] + (["numpy"] if importlib.util.find_spec("numpy") else [])
+        for engine in engines:
+            Habit.update_all_streaks(engine=engine)
+            Habit.update_all_streaks(engine=engine, full=True)
+
+        repository = HabitRepository()
+        repository.complete_task(repository.get("Habit 2"), date=now + timedelta(days=1))
+        repository.exists("Missing habit")
+        repository.all()
+        saved_bitmaps = bitmaps.ENABLED
+        bitmaps.ENABLED = True
+        try:
+            habit = repository.get("Habit 3")
+            repository.is_completed_today(habit)
+            repository.complete_task(habit, date=now + timedelta(days=1))
+            repository.is_completed_within_7_days(habit)
+            repository.completion_rate("Habit 3", 30)
+        finally:
+            bitmaps.ENABLED = saved_bitmaps
+
+        analytics.get_all_habits()
+        analytics.get_incomplete_habits_for_today()
+        analytics.get_habits_by_periodicity("weekly")
+        analytics.longest_streak_all_habits()
+        analytics.longest_streak_for_habit("Habit 0")
+        analytics.get_completions("Habit 0")
+        analytics.completion_rate("Habit 3", 30)
+
+        weekly.delete()
+        clear_db.clear_database()
+
+def check():
+    """
+    Runs the workload against a fresh database, explains every statement it issued and
+    every trigger statement, and checks that no statement scans the completion history.
+
+    Returns:
+        tuple: (results, uncovered). results is a list of dicts with 'source', 'sql',
+            'plan' (rows, or the error raised), 'scans' and 'allowed'; uncovered lists
+            the shipped statements the workload never ran.
+    """
+    recorder = PlanRecorder()
+    saved_db_name = db.DB_NAME
+    with tempfile.TemporaryDirectory() as workdir:
+        db.DB_NAME = os.path.join(workdir, "habits.db")
+        sql_stats.LISTENERS.append(recorder)
+        try:
+            if not sql_stats.ENABLED:
+                raise RuntimeError("The query plan check needs the SQL hooks; unset HABIT_SQL_STATS.")
+            run_workload()
+            conn = db.get_connection()
+            views = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'view'").fetchall())
+            statements = [("workload", sql, plan) for sql, plan in recorder.plans.items()]
+            for trigger, sql in trigger_statements(conn):
+                try:
+                    plan = conn.execute("EXPLAIN QUERY PLAN " + sql, _dummy_params(sql)).fetchall()
+                except sqlite3.Error as error:
+                    plan = error
+                statements.append((f"trigger {trigger}", sql, plan))
+        finally:
+            sql_stats.LISTENERS.remove(recorder)
+            db.close_connection()
+            db.DB_NAME = saved_db_name
+
+    results = []
+    for source, sql, plan in statements:
+        scans = [] if isinstance(plan, Exception) else completion_scans(plan, sql, views)
+        results.append({"source": source, "sql": sql, "plan": plan, "scans": scans, "allowed": sql in ALLOWED_SCANS})
+
+    uncovered = []
+    for location, text, exact in shipped_queries():
+        ran = text in recorder.plans if exact else any(sql.startswith(text) for sql in recorder.plans)
+        if not ran and text not in UNREACHABLE:
+            uncovered.append((location, text))
+    return results, uncovered
+
+def main():
+    """Prints the plan check and exits non-zero if a statement scans completions or was not exercised."""
+    parser = argparse.ArgumentParser(description="Check that shipped queries never scan the completion history.")
+    parser.add_argument("--verbose", action="store_true", help="print the plan of every statement")
+    args = parser.parse_args()
+
+    results, uncovered = check()
+    failures = 0
+    for result in results:
+        sql = result["sql"] if len(result["sql"]) <= 100 else result["sql"][:97] + "..."
+        if isinstance(result["plan"], Exception):
+            status = f"ERROR {result['plan']}"
+            failures += 1
+        elif result["scans"] and result["allowed"]:
+            status = f"allowed scan: {ALLOWED_SCANS[result['sql']]}"
+        elif result["scans"]:
+            status = "FULL SCAN: " + "; ".join(result["scans"])
+            failures += 1
+        else:
+            status = "ok"
+        if args.verbose or status != "ok":
+            print(f"[{result['source']}] {sql}\n    {status}")
+            if args.verbose and not isinstance(result["plan"], Exception):
+                for _, _, _, detail in result["plan"]:
+                    print(f"      {detail}")
+    for location, text in uncovered:
+        print(f"[{location}] not exercised by the workload: {text[:80]}")
+        failures += 1
+
+    print(f"{len(results)} statements checked, {failures} problem(s).")
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,14 @@
 # clear_db.py
 
-import sqlite3
-
-DB_NAME = 'habits.db'
+from db import get_connection
 
 def clear_database():
     """
     Clears all data from the 'habits' and 'completions' tables in the database
     if these tables exist. This helps prevent errors if tables are missing.
     """
-    with sqlite3.connect(DB_NAME) as conn:
+    conn = get_connection()
+    with conn:
         cursor = conn.cursor()
         
         # Check for 'habits' table existence before deletion
@@ -17,7 +16,12 @@ def clear_database():
         if cursor.fetchone():
             cursor.execute("DELETE FROM habits")
         
-        # Check for 'completions' table existence before deletion
+        # Check for 'completion_days' table existence before deletion
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='completion_days'")
+        if cursor.fetchone():
+            cursor.execute("DELETE FROM completion_days")
+
+        # Databases from before day ordinals still keep completions in a 'completions' table
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='completions'")
         if cursor.fetchone():
             cursor.execute("DELETE FROM completions")
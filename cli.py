@@ -1,26 +1,61 @@
+import time
+
+STARTED = time.perf_counter()
+
 import click
-from habit_tracker import Habit, setup_database
-from analytics import (
-    get_all_habits,
-    get_incomplete_habits_for_today,
-    get_habits_by_periodicity,
-    longest_streak_all_habits,
-    longest_streak_for_habit
-)
+
+import commands
+
+# Modules the commands need are imported inside them, so an invocation only loads what its
+# command uses
+IMPORTED = time.perf_counter()
 
 @click.group(invoke_without_command=True)
 @click.pass_context
+@click.option('--timing', is_flag=True)
+@click.option('--profile', is_flag=True)
+@click.option('--profile-output', type=click.Path(dir_okay=False, writable=True), default=None)
+@click.option('--profile-sort', type=click.Choice(['cumulative', 'tottime', 'calls']), default='cumulative')
+@click.option('--trace-memory', is_flag=True)
 @click.option('--help', is_flag=True, is_eager=True, expose_value=False, callback=lambda ctx, param, value: print_cli_help(ctx) if value else None)
-def cli(ctx):
+def cli(ctx, timing, profile, profile_output, profile_sort, trace_memory):
     """
-    CLI entry point for habit tracking commands. Initializes database setup and updates all streaks
-    to ensure data is current before processing commands.
+    CLI entry point for habit tracking commands. Initializes database setup and, for commands
+    that modify data or display streaks, refreshes the streaks of habits whose completions
+    changed since their streak was last computed.
+
+    Commands run by the daemon (see 'serve') skip both steps: the daemon has set up the
+    database already and refreshes streaks itself when they can have changed.
 
     Args:
         ctx: The context object, used to detect if a subcommand is invoked.
-    """
-    setup_database()
-    Habit.update_all_streaks()
+        timing: Report the time spent importing, setting up and running the command.
+        profile: Run setup and the command under cProfile and print the busiest functions.
+        profile_output: Also write the raw profile to this file; implies profile.
+        profile_sort: The pstats key the printed profile is sorted by.
+        trace_memory: Trace setup and the command with tracemalloc and print where memory went.
+    """
+    # The profilers start before setup, so the streak refresh shows up in their reports
+    if profile or profile_output:
+        import profiling
+        profiler = profiling.start_profile()
+        ctx.call_on_close(lambda: click.echo(
+            profiling.profile_report(profiler, profile_sort, output=profile_output), err=True))
+    if trace_memory:
+        import profiling
+        profiling.start_memory_trace()
+        ctx.call_on_close(lambda: click.echo(profiling.memory_report(), err=True))
+
+    setup_started = time.perf_counter()
+    if not (ctx.obj or {}).get('warm'):
+        commands.prepare(ctx.invoked_subcommand)
+    if timing:
+        setup_finished = time.perf_counter()
+        ctx.call_on_close(lambda: click.echo(commands.format_timing([
+            ("imports", IMPORTED - STARTED),
+            ("setup", setup_finished - setup_started),
+            ("command", time.perf_counter() - setup_finished),
+        ]), err=True))
     if ctx.invoked_subcommand is None:
         print_cli_help(ctx)
 
@@ -39,11 +74,19 @@ Usage:
   python cli.py [OPTIONS] COMMAND [ARGS]
 
 Options:
-  --help     Show detailed usage.
+  --help                 Show detailed usage.
+  --timing               Report the time spent on imports, database setup and the command.
+  --profile              Run database setup and the command under cProfile and print the
+                         25 most expensive functions to stderr.
+  --profile-sort KEY     Sort the profile by 'cumulative' (default), 'tottime' or 'calls'.
+  --profile-output FILE  Also save the raw profile, for pstats or snakeviz. Implies --profile.
+  --trace-memory         Trace allocations with tracemalloc and print the peak memory use and
+                         the 10 allocation sites holding the most memory to stderr.
 
 Examples:
   python .\\cli.py add --help
   python .\\cli.py add "Shooting practice" daily
+  python .\\cli.py --profile --profile-output list.prof list-incomplete
 
 Commands:
   add                   Add a habit with a specific name and frequency (e.g., daily or weekly).
@@ -55,6 +98,9 @@ Commands:
   complete              Mark a habit as completed for today.
                             Example: python cli.py complete "Exercise"
 
+  complete-batch        Mark many habits as completed from CSV or JSON Lines input.
+                            Example: python cli.py complete-batch < completions.csv
+
   delete                Remove a habit and all related completion records.
                             Example: python cli.py delete "Exercise"
 
@@ -70,6 +116,18 @@ Commands:
   longest-streak        Show the longest streak across all habits.
                             Example: python cli.py longest-streak
 
+  metrics               Show this session's metrics in the Prometheus text format.
+                            Example: python client.py metrics
+
+  shell                 Run commands interactively or from a script file in one session.
+                            Example: python cli.py shell commands.txt
+
+  serve                 Run a daemon that executes commands sent by client.py over a Unix socket.
+                            Example: python cli.py serve
+
+  stats                 Show timing counters for the SQL statements run in this session.
+                            Example: python client.py stats
+
   streak-for-habit      Show the longest streak for a specific habit by name.
                             Example: python cli.py streak-for-habit "Exercise"
 """)
@@ -87,12 +145,7 @@ def add(name, periodicity):
         name: The name of the habit to add.
         periodicity: The frequency of the habit ('daily' or 'weekly').
     """
-    habit = Habit(name, periodicity)
-    if habit.exists_in_db():
-        click.echo(f"Habit '{name}' already exists.")
-    else:
-        habit.save()
-        click.echo(f"Habit '{name}' added with a periodicity of '{periodicity}'.")
+    commands.add(name, periodicity, click.echo)
 
 def print_add_help(ctx):
     """
@@ -125,14 +178,7 @@ def check_today(name):
     Args:
         name: The name of the habit to check.
     """
-    habit = Habit(name, periodicity="daily")
-    if habit.exists_in_db():
-        if habit.is_completed_today():
-            click.echo(f"Habit '{name}' has already been completed today.")
-        else:
-            click.echo(f"Habit '{name}' has NOT been completed today.")
-    else:
-        click.echo(f"Habit '{name}' does not exist.")
+    commands.check_today(name, click.echo)
 
 def print_check_today_help(ctx):
     """
@@ -163,15 +209,7 @@ def complete(name):
     Args:
         name: The name of the habit to mark as completed.
     """
-    habit = Habit(name, periodicity="daily")
-    if habit.exists_in_db():
-        if habit.is_completed_today():
-            click.echo(f"Habit '{name}' has already been completed today.")
-        else:
-            habit.complete_task()
-            click.echo(f"Habit '{name}' marked as completed for today.")
-    else:
-        click.echo(f"Habit '{name}' does not exist.")
+    commands.complete(name, click.echo)
 
 def print_complete_help(ctx):
     """
@@ -192,6 +230,87 @@ Example:
 """)
     ctx.exit()
 
+@cli.command()
+@click.argument('source', type=click.File('r'), default='-')
+@click.option('--format', 'input_format', type=click.Choice(['csv', 'jsonl']), default='csv')
+@click.option('--help', is_flag=True, is_eager=True, expose_value=False, callback=lambda ctx, param, value: print_complete_batch_help(ctx) if value else None)
+def complete_batch(source, input_format):
+    """
+    Marks many habits as completed in one transaction, reading records from a file or stdin.
+
+    Args:
+        source: The open input file; '-' (the default) reads stdin.
+        input_format: 'csv' for a header row with name,date[,time] columns, or 'jsonl'
+            for one {"name": ..., "date": ..., "time": ...} object per line.
+
+    Malformed records are skipped and reported with their line number; the others are
+    still completed.
+    """
+    import csv
+    import json
+    from habit_tracker import Habit
+
+    # (line number, row) pairs, where row is None for a line that is not a JSON object
+    entries = []
+    if input_format == 'csv':
+        reader = csv.DictReader(source)
+        if reader.fieldnames is not None and 'name' not in reader.fieldnames:
+            raise click.BadParameter("line 1: the CSV header has no 'name' column.", param_hint="'SOURCE'")
+        for row in reader:
+            entries.append((reader.line_num, row))
+    else:
+        for line_number, line in enumerate(source, 1):
+            if line.strip():
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                entries.append((line_number, row if isinstance(row, dict) else None))
+
+    records, line_numbers, invalid = [], [], []
+    for line_number, row in entries:
+        if row is None:
+            invalid.append((line_number, "not a JSON object"))
+            continue
+        records.append((row.get('name'), row.get('date') or None, row.get('time') or None))
+        line_numbers.append(line_number)
+
+    result = Habit.complete_many(records)
+    invalid += [(line_numbers[position], reason) for position, reason in result['invalid']]
+    skipped = result['skipped'] + len(entries) - len(records)
+    click.echo(f"Completed {result['completed']} of {len(entries)} records, skipped {skipped}.")
+    for line_number, reason in sorted(invalid):
+        click.echo(f"Line {line_number}: {reason}.")
+    for name in result['unknown']:
+        click.echo(f"Habit '{name}' does not exist.")
+
+def print_complete_batch_help(ctx):
+    """
+    Provides help information for the 'complete-batch' command.
+
+    Args:
+        ctx: The context object for CLI commands.
+    """
+    click.echo("""
+Usage:
+  python cli.py complete-batch [--format csv|jsonl] [FILE]
+
+Arguments:
+  FILE          The file to read records from. Reads stdin when omitted.
+
+Options:
+  --format      The input format, choose from {csv|jsonl}. Defaults to csv.
+                CSV input needs a header row with the columns name,date and optionally time.
+                JSON Lines input needs one object per line with "name", "date" and optionally "time".
+                A missing date means today. Malformed records are skipped and reported
+                with their line number.
+
+Examples:
+  python cli.py complete-batch completions.csv
+  python cli.py complete-batch --format jsonl < completions.jsonl
+""")
+    ctx.exit()
+
 @cli.command()
 @click.argument('name')
 @click.option('--help', is_flag=True, is_eager=True, expose_value=False, callback=lambda ctx, param, value: print_delete_help(ctx) if value else None)
@@ -202,12 +321,7 @@ def delete(name):
     Args:
         name: The name of the habit to delete.
     """
-    habit = Habit(name, periodicity="daily")
-    if habit.exists_in_db():
-        habit.delete()
-        click.echo(f"Habit '{name}' and its completions have been deleted.")
-    else:
-        click.echo(f"Habit '{name}' does not exist.")
+    commands.delete(name, click.echo)
 
 def print_delete_help(ctx):
     """
@@ -233,12 +347,7 @@ def list_all():
     """
     Lists all habits currently being tracked.
     """
-    habits = get_all_habits()
-    if habits:
-        for habit in habits:
-            click.echo(f"Habit: {habit[0]}, Periodicity: {habit[1]}, Created At: {habit[2]}, Streak: {habit[3]}")
-    else:
-        click.echo("No habits found.")
+    commands.list_all(click.echo)
 
 @cli.command()
 @click.option('--help', is_flag=True, is_eager=True, expose_value=False, callback=lambda ctx, param, value: print_list_incomplete_help(ctx) if value else None)
@@ -246,12 +355,7 @@ def list_incomplete():
     """
     Lists habits that have not been completed today.
     """
-    habits = get_incomplete_habits_for_today()
-    if habits:
-        for habit in habits:
-            click.echo(f"Habit: {habit[0]}, Periodicity: {habit[1]}, Created At: {habit[2]}, Streak: {habit[3]}")
-    else:
-        click.echo("All habits have been completed for today.")
+    commands.list_incomplete(click.echo)
 
 def print_list_incomplete_help(ctx):
     """
@@ -282,9 +386,7 @@ def list_by_periodicity(periodicity):
     Args:
         periodicity: The periodicity to filter by ('daily' or 'weekly').
     """
-    habits = get_habits_by_periodicity(periodicity)
-    for habit in habits:
-        click.echo(f"Habit: {habit[0]}, Periodicity: {habit[1]}, Created At: {habit[2]}, Streak: {habit[3]}")
+    commands.list_by_periodicity(periodicity, click.echo)
 
 def print_list_by_periodicity_help(ctx):
     """
@@ -312,8 +414,7 @@ def longest_streak():
     """
     Displays the longest streak across all habits.
     """
-    longest_streak = longest_streak_all_habits()
-    click.echo(f"The longest streak across all habits is: {longest_streak}")
+    commands.longest_streak(click.echo)
 
 def print_longest_streak_help(ctx):
     """
@@ -344,11 +445,7 @@ def streak_for_habit(name):
     Args:
         name: The name of the habit to display the streak for.
     """
-    streak = longest_streak_for_habit(name)
-    if streak is not None:
-        click.echo(f"The longest streak for '{name}' is: {streak}")
-    else:
-        click.echo(f"Habit '{name}' does not exist.")
+    commands.streak_for_habit(name, click.echo)
 
 def print_streak_for_habit_help(ctx):
     """
@@ -369,5 +466,168 @@ Example:
 """)
     ctx.exit()
 
+@cli.command()
+@click.option('--socket', 'socket_path', default=None)
+@click.option('--metrics-port', type=int, default=None)
+@click.option('--help', is_flag=True, is_eager=True, expose_value=False, callback=lambda ctx, param, value: print_serve_help(ctx) if value else None)
+def serve(socket_path, metrics_port):
+    """
+    Runs a daemon that keeps the database connection open and executes commands sent by
+    client.py, so each command skips interpreter start-up and database setup.
+
+    Args:
+        socket_path: Path of the Unix domain socket to listen on.
+        metrics_port: Local TCP port to serve Prometheus metrics on, or None for no endpoint.
+    """
+    import daemon
+    daemon.serve(cli, socket_path, metrics_port)
+
+def print_serve_help(ctx):
+    """
+    Provides help information for the 'serve' command.
+
+    Args:
+        ctx: The context object for CLI commands.
+    """
+    click.echo("""
+Usage:
+  python cli.py serve [--socket PATH] [--metrics-port PORT]
+
+Options:
+  --socket        The Unix domain socket to listen on. Defaults to $HABIT_DAEMON_SOCKET,
+                  or habits.sock in the current directory.
+  --metrics-port  Also serve the daemon's metrics for Prometheus at
+                  http://127.0.0.1:PORT/metrics.
+
+Description:
+  Keep a database connection open and run the commands sent by client.py, which
+  takes the same arguments as cli.py. Pass a daemon started with --socket PATH the
+  same option first: python client.py --socket PATH COMMAND. Stop the daemon with Ctrl+C.
+
+Examples:
+  python cli.py serve
+  python cli.py serve --metrics-port 9464
+  python client.py complete "Exercise"
+  python cli.py serve --socket /tmp/habits.sock
+  python client.py --socket /tmp/habits.sock list-all
+""")
+    ctx.exit()
+
+@cli.command()
+@click.option('--help', is_flag=True, is_eager=True, expose_value=False, callback=lambda ctx, param, value: print_metrics_help(ctx) if value else None)
+def metrics():
+    """
+    Displays the metrics of this process in the Prometheus text exposition format.
+    """
+    commands.metrics(click.echo)
+
+def print_metrics_help(ctx):
+    """
+    Provides help information for the 'metrics' command.
+
+    Args:
+        ctx: The context object for CLI commands.
+    """
+    click.echo("""
+Usage:
+  python cli.py metrics
+
+Description:
+  Show the completions written, streak recomputations (full and incremental), analytics
+  query latencies and database connection usage of this process, in the Prometheus text
+  exposition format. Metrics are kept per process, so they are most useful inside
+  'python cli.py shell' or sent to a daemon with 'python client.py metrics'. A daemon
+  started with --metrics-port also serves them over HTTP for Prometheus to scrape.
+
+Examples:
+  python client.py metrics
+  python cli.py serve --metrics-port 9464
+""")
+    ctx.exit()
+
+@cli.command()
+@click.option('--reset', is_flag=True)
+@click.option('--limit', type=int, default=20)
+@click.option('--help', is_flag=True, is_eager=True, expose_value=False, callback=lambda ctx, param, value: print_stats_help(ctx) if value else None)
+def stats(reset, limit):
+    """
+    Displays timing counters for the SQL statements run by this process.
+
+    Args:
+        reset: Clear the counters after displaying them.
+        limit: The number of statements to show.
+    """
+    commands.stats(reset, limit, click.echo)
+
+def print_stats_help(ctx):
+    """
+    Provides help information for the 'stats' command.
+
+    Args:
+        ctx: The context object for CLI commands.
+    """
+    click.echo("""
+Usage:
+  python cli.py stats [--reset] [--limit N]
+
+Options:
+  --reset       Clear the counters after showing them.
+  --limit       The number of statements to show. Defaults to 20.
+
+Description:
+  Show how often each SQL statement ran, how long it took and how many rows it returned
+  or changed. Counters are kept per process, so they are most useful inside
+  'python cli.py shell' or sent to a daemon with 'python client.py stats'.
+  Statements taking at least $HABIT_SLOW_QUERY_MS milliseconds (default 100) are also
+  appended to the slow-query log, $HABIT_SLOW_QUERY_LOG (default slow_queries.log).
+
+Examples:
+  python client.py stats
+  python client.py stats --reset
+""")
+    ctx.exit()
+
+@cli.command()
+@click.argument('script', type=click.File('r'), required=False)
+@click.option('--help', is_flag=True, is_eager=True, expose_value=False, callback=lambda ctx, param, value: print_shell_help(ctx) if value else None)
+@click.pass_context
+def shell(ctx, script):
+    """
+    Runs commands in one session that keeps the database connection open, reading them
+    interactively or from a script file.
+
+    Args:
+        ctx: The context object, used to report the script's exit code.
+        script: The open script file with one command per line, or None for a prompt.
+    """
+    from session import CommandSession, run_interactive, run_script
+    session = CommandSession(cli)
+    if script is None:
+        run_interactive(session)
+    else:
+        ctx.exit(run_script(session, script))
+
+def print_shell_help(ctx):
+    """
+    Provides help information for the 'shell' command.
+
+    Args:
+        ctx: The context object for CLI commands.
+    """
+    click.echo("""
+Usage:
+  python cli.py shell [SCRIPT]
+
+Arguments:
+  SCRIPT        A file with one command per line, written as after 'python cli.py'.
+                Blank lines and lines starting with # are skipped. '-' reads stdin.
+                Without SCRIPT an interactive prompt is started; leave it with 'exit'.
+
+Examples:
+  python cli.py shell
+  python cli.py shell commands.txt
+""")
+    ctx.exit()
+
 if __name__ == '__main__':
     cli()
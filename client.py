@@ -0,0 +1,77 @@
+# File: client.py
+
+import sys
+
+import daemon
+
+def _inline_batch_source(args):
+    """
+    Reads the input of a 'complete-batch' command on the client side, so the daemon does
+    not have to open files relative to its own working directory.
+
+    Args:
+        args (list): The 'complete-batch' command line.
+
+    Returns:
+        tuple: The command line reading from stdin instead, and the input text.
+    """
+    options, source = [], None
+    remaining = iter(args[1:])
+    for arg in remaining:
+        if arg == "--format":
+            options += [arg, next(remaining, "")]
+        elif arg.startswith("-") and arg != "-":
+            options.append(arg)
+        else:
+            source = arg
+    if source in (None, "-"):
+        text = sys.stdin.read()
+    else:
+        with open(source, newline="") as file:
+            text = file.read()
+    return [args[0], *options, "-"], text
+
+def _socket_option(args):
+    """
+    Takes a leading '--socket PATH' or '--socket=PATH' off the command line, the same
+    option 'python cli.py serve' accepts.
+
+    Returns:
+        tuple: The socket path, or None for the default, and the remaining command line.
+    """
+    if args and args[0] == "--socket" and len(args) > 1:
+        return args[1], args[2:]
+    if args and args[0].startswith("--socket="):
+        return args[0].split("=", 1)[1], args[1:]
+    return None, args
+
+def main(argv=None):
+    """
+    Forwards a command line to the daemon started with 'python cli.py serve' and prints
+    its output. Takes the same arguments as cli.py, e.g. python client.py complete "Exercise",
+    optionally preceded by the --socket PATH the daemon was started with.
+
+    Args:
+        argv (list): The command line to forward. Defaults to sys.argv[1:].
+
+    Returns:
+        int: The exit code of the command.
+    """
+    args = sys.argv[1:] if argv is None else list(argv)
+    socket_path, args = _socket_option(args)
+    stdin = ""
+    if args and args[0] == "complete-batch" and "--help" not in args:
+        args, stdin = _inline_batch_source(args)
+
+    try:
+        response = daemon.request(args, stdin, socket_path)
+    except OSError:
+        print(f"No daemon is listening on '{socket_path or daemon.SOCKET_PATH}'. Start one with: python cli.py serve",
+              file=sys.stderr)
+        return 1
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    return response["exit_code"]
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,252 @@
+# File: commands.py
+
+# The bodies of the CLI commands, kept free of click so fastcli.py can run them without
+# paying for its import. Each command imports the modules it needs when it runs and prints
+# through the echo function it is given (click.echo from cli.py, print from fastcli.py).
+
+PERIODICITIES = ('daily', 'weekly')
+
+# Commands that neither write data nor display streaks; they skip the streak refresh
+# before running. Commands that display streaks still refresh, so a streak that lapsed
+# or was left stale by a migration is never shown.
+STREAK_FREE_COMMANDS = {
+    'check-today',
+    'list-by-periodicity',
+    'metrics',
+    'stats',
+}
+
+def prepare(command):
+    """
+    Sets up the database and, unless the command neither writes data nor displays streaks,
+    refreshes the streaks of habits whose completions changed since their streak was last
+    computed and of ongoing streaks that may have lapsed since.
+
+    Args:
+        command (str): The name of the command about to run, or None.
+    """
+    from habit_tracker import Habit, setup_database
+    setup_database()
+    if command is not None and command not in STREAK_FREE_COMMANDS:
+        Habit.update_all_streaks()
+
+def add(name, periodicity, echo=print):
+    """
+    Adds a new habit to the database.
+
+    Args:
+        name (str): The name of the habit to add.
+        periodicity (str): The frequency of the habit ('daily' or 'weekly').
+        echo (callable): Prints one line of output.
+    """
+    from habit_tracker import Habit
+    from repository import get_repository
+    if get_repository().save(Habit(name, periodicity)):
+        echo(f"Habit '{name}' added with a periodicity of '{periodicity}'.")
+    else:
+        echo(f"Habit '{name}' already exists.")
+
+def check_today(name, echo=print):
+    """
+    Checks if the specified habit has been completed today.
+
+    Args:
+        name (str): The name of the habit to check.
+        echo (callable): Prints one line of output.
+    """
+    from repository import get_repository
+    repository = get_repository()
+    habit = repository.get(name)
+    if habit is None:
+        echo(f"Habit '{name}' does not exist.")
+    elif repository.is_completed_today(habit):
+        echo(f"Habit '{name}' has already been completed today.")
+    else:
+        echo(f"Habit '{name}' has NOT been completed today.")
+
+def complete(name, echo=print):
+    """
+    Marks the specified habit as completed for today.
+
+    Args:
+        name (str): The name of the habit to mark as completed.
+        echo (callable): Prints one line of output.
+    """
+    from repository import get_repository
+    repository = get_repository()
+    habit = repository.get(name)
+    if habit is None:
+        echo(f"Habit '{name}' does not exist.")
+    elif repository.is_completed_today(habit):
+        echo(f"Habit '{name}' has already been completed today.")
+    elif habit.periodicity == "weekly" and repository.is_completed_within_7_days(habit):
+        echo(f"Habit '{name}' has already been completed within the last 7 days.")
+    elif repository.complete_task(habit):
+        echo(f"Habit '{name}' marked as completed for today.")
+
+def delete(name, echo=print):
+    """
+    Deletes a habit and all associated completion records.
+
+    Args:
+        name (str): The name of the habit to delete.
+        echo (callable): Prints one line of output.
+    """
+    from repository import get_repository
+    if get_repository().delete(name):
+        echo(f"Habit '{name}' and its completions have been deleted.")
+    else:
+        echo(f"Habit '{name}' does not exist.")
+
+def list_all(echo=print):
+    """
+    Lists all habits currently being tracked.
+
+    Args:
+        echo (callable): Prints one line of output.
+    """
+    from analytics import get_all_habits
+    habits = get_all_habits()
+    if habits:
+        for habit in habits:
+            echo(f"Habit: {habit[0]}, Periodicity: {habit[1]}, Created At: {habit[2]}, Streak: {habit[3]}")
+    else:
+        echo("No habits found.")
+
+def list_incomplete(echo=print):
+    """
+    Lists habits that have not been completed today.
+
+    Args:
+        echo (callable): Prints one line of output.
+    """
+    from analytics import get_incomplete_habits_for_today
+    habits = get_incomplete_habits_for_today()
+    if habits:
+        for habit in habits:
+            echo(f"Habit: {habit[0]}, Periodicity: {habit[1]}, Created At: {habit[2]}, Streak: {habit[3]}")
+    else:
+        echo("All habits have been completed for today.")
+
+def list_by_periodicity(periodicity, echo=print):
+    """
+    Lists habits filtered by their specified periodicity.
+
+    Args:
+        periodicity (str): The periodicity to filter by ('daily' or 'weekly').
+        echo (callable): Prints one line of output.
+    """
+    from analytics import get_habits_by_periodicity
+    habits = get_habits_by_periodicity(periodicity)
+    for habit in habits:
+        echo(f"Habit: {habit[0]}, Periodicity: {habit[1]}, Created At: {habit[2]}, Streak: {habit[3]}")
+
+def longest_streak(echo=print):
+    """
+    Displays the longest streak across all habits.
+
+    Args:
+        echo (callable): Prints one line of output.
+    """
+    from analytics import longest_streak_all_habits
+    longest_streak = longest_streak_all_habits()
+    echo(f"The longest streak across all habits is: {longest_streak}")
+
+def streak_for_habit(name, echo=print):
+    """
+    Displays the longest streak for a specific habit by name.
+
+    Args:
+        name (str): The name of the habit to display the streak for.
+        echo (callable): Prints one line of output.
+    """
+    from analytics import longest_streak_for_habit
+    streak = longest_streak_for_habit(name)
+    if streak is not None:
+        echo(f"The longest streak for '{name}' is: {streak}")
+    else:
+        echo(f"Habit '{name}' does not exist.")
+
+def stats(reset=False, limit=20, echo=print):
+    """
+    Displays the SQL statement counters of the current process, busiest statements first.
+
+    Args:
+        reset (bool): Clear the counters after displaying them.
+        limit (int): The number of statements to show.
+        echo (callable): Prints one line of output.
+    """
+    import sql_stats
+    entries = sql_stats.snapshot()
+    if not sql_stats.ENABLED:
+        echo("SQL statistics are disabled (HABIT_SQL_STATS=0).")
+        return
+    echo("SQL statements run by this process, busiest first. Counters cover one process, so run")
+    echo("'stats' inside 'cli.py shell' or through client.py to see a long-running session.")
+    echo(f"{'calls':>7} {'total ms':>10} {'mean ms':>9} {'max ms':>9} {'rows':>8}  statement")
+    for entry in entries[:limit]:
+        sql = entry["sql"] if len(entry["sql"]) <= 80 else entry["sql"][:77] + "..."
+        echo(f"{entry['calls']:>7} {entry['total_s'] * 1000:>10.2f} {entry['mean_s'] * 1000:>9.3f} "
+             f"{entry['max_s'] * 1000:>9.3f} {entry['rows']:>8}  {sql}")
+    if reset:
+        sql_stats.reset()
+        echo("Counters have been reset.")
+
+def metrics(echo=print):
+    """
+    Displays the metrics of the current process in the Prometheus text exposition format.
+
+    Args:
+        echo (callable): Prints one line of output.
+    """
+    import metrics
+    echo(metrics.render().rstrip("\n"))
+
+# Commands fastcli.py runs without click, with the kind of each positional argument they take
+FAST_COMMANDS = {
+    'add': (add, ('name', 'periodicity')),
+    'check-today': (check_today, ('name',)),
+    'complete': (complete, ('name',)),
+    'delete': (delete, ('name',)),
+    'list-all': (list_all, ()),
+    'list-incomplete': (list_incomplete, ()),
+    'list-by-periodicity': (list_by_periodicity, ('periodicity',)),
+    'longest-streak': (longest_streak, ()),
+    'streak-for-habit': (streak_for_habit, ('name',)),
+}
+
+def fast_command(args):
+    """
+    Finds the command a command line can run without click: one of FAST_COMMANDS with
+    exactly its positional arguments, no options and a valid periodicity. Anything else,
+    including --help and invalid input, is left to cli.py for its usage and error messages.
+
+    Args:
+        args (list): The command line after the program name.
+
+    Returns:
+        callable or None: The command function, or None if click has to handle the line.
+    """
+    if not args or args[0] not in FAST_COMMANDS:
+        return None
+    function, kinds = FAST_COMMANDS[args[0]]
+    values = args[1:]
+    if len(values) != len(kinds) or any(value.startswith('-') for value in values):
+        return None
+    if any(kind == 'periodicity' and value not in PERIODICITIES for kind, value in zip(kinds, values)):
+        return None
+    return function
+
+def format_timing(phases):
+    """
+    Formats the time spent in each startup phase of a command.
+
+    Args:
+        phases (list): (phase name, seconds) pairs in the order they happened.
+
+    Returns:
+        str: A one-line report such as 'Timing: imports 3.1 ms, setup 0.8 ms, total 3.9 ms'.
+    """
+    parts = [f"{name} {seconds * 1000:.1f} ms" for name, seconds in phases]
+    parts.append(f"total {sum(seconds for _, seconds in phases) * 1000:.1f} ms")
+    return "Timing: " + ", ".join(parts)
@@ -0,0 +1,180 @@
+# File: daemon.py
+
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+
+SOCKET_PATH = os.environ.get("HABIT_DAEMON_SOCKET", "habits.sock")
+
+class CommandHandler(socketserver.StreamRequestHandler):
+    """
+    Serves one client connection. Every line the client sends is a JSON request
+    {"args": [...], "stdin": "..."}; every request is answered with one JSON line
+    {"stdout": "...", "stderr": "...", "exit_code": n}. A line that is not a valid request
+    is answered with exit code 2, so the client never waits for a reply that is not coming.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            request = _parse_request(line)
+            if request is None:
+                response = {"stdout": "", "stderr": "invalid request\n", "exit_code": 2}
+            else:
+                response = self.server.run(request)
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+def _parse_request(line):
+    """
+    Decodes one request line.
+
+    Returns:
+        dict or None: The request, or None if the line is not a JSON object with a list of
+            string 'args' and an optional string 'stdin'.
+    """
+    try:
+        request = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(request, dict):
+        return None
+    args, stdin = request.get("args", []), request.get("stdin", "")
+    if not isinstance(args, list) or not all(isinstance(arg, str) for arg in args) or not isinstance(stdin, str):
+        return None
+    return request
+
+class HabitServer(socketserver.UnixStreamServer):
+    """
+    Runs CLI commands for clients on a Unix domain socket, one command at a time, in a
+    CommandSession whose connection stays open between commands.
+    """
+
+    def __init__(self, socket_path, group):
+        """
+        Args:
+            socket_path (str): Path of the Unix domain socket to listen on.
+            group (click.Group): The CLI command group to run requests with.
+        """
+        from session import CommandSession
+
+        super().__init__(socket_path, CommandHandler)
+        self.session = CommandSession(group)
+
+    def run(self, request):
+        """
+        Runs one CLI command and captures what it prints.
+
+        Args:
+            request (dict): 'args', the command line after 'cli.py', and optionally
+                'stdin', the text the command reads as its standard input.
+
+        Returns:
+            dict: The command's 'stdout', 'stderr' and 'exit_code'.
+        """
+        stdout, stderr = io.StringIO(), io.StringIO()
+        stdin = io.TextIOWrapper(io.BytesIO(request.get("stdin", "").encode("utf-8")), encoding="utf-8")
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr), _stdin(stdin):
+            exit_code = self.session.invoke(request.get("args", []))
+        return {"stdout": stdout.getvalue(), "stderr": stderr.getvalue(), "exit_code": exit_code}
+
+@contextlib.contextmanager
+def _stdin(stream):
+    """Temporarily replaces sys.stdin, the counterpart of contextlib.redirect_stdout."""
+    saved, sys.stdin = sys.stdin, stream
+    try:
+        yield
+    finally:
+        sys.stdin = saved
+
+def serve(group, socket_path=None, metrics_port=None):
+    """
+    Sets up the database and serves CLI commands on a Unix domain socket until interrupted.
+
+    Args:
+        group (click.Group): The CLI command group to run requests with.
+        socket_path (str): Path of the socket. Defaults to SOCKET_PATH.
+        metrics_port (int, optional): Also serve the process's metrics over HTTP on this
+            local port, at /metrics.
+    """
+    from db import close_all
+
+    socket_path = socket_path or SOCKET_PATH
+    if not hasattr(socket, "AF_UNIX"):
+        print("The daemon needs Unix domain sockets, which this platform does not provide.")
+        return
+    if os.path.exists(socket_path):
+        if is_running(socket_path):
+            print(f"A daemon is already listening on '{socket_path}'.")
+            return
+        # Left behind by a daemon that did not shut down cleanly
+        os.unlink(socket_path)
+
+    server = HabitServer(socket_path, group)
+    metrics_server = None
+    if metrics_port is not None:
+        import metrics
+        metrics_server = metrics.start_http_server(metrics_port)
+        print(f"Serving metrics on http://127.0.0.1:{metrics_server.server_port}/metrics.")
+    signal.signal(signal.SIGTERM, _stop)
+    print(f"Listening on '{socket_path}'. Press Ctrl+C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if metrics_server is not None:
+            metrics_server.shutdown()
+            metrics_server.server_close()
+        server.server_close()
+        os.unlink(socket_path)
+        close_all()
+
+def _stop(signum, frame):
+    """Turns SIGTERM into the same clean shutdown as Ctrl+C."""
+    raise KeyboardInterrupt
+
+def is_running(socket_path=None):
+    """
+    Checks whether a daemon is accepting connections on the socket.
+
+    Args:
+        socket_path (str): Path of the socket. Defaults to SOCKET_PATH.
+
+    Returns:
+        bool: True if a daemon answered, False otherwise.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(socket_path or SOCKET_PATH)
+        except OSError:
+            return False
+    return True
+
+def request(args, stdin="", socket_path=None):
+    """
+    Sends one command to a running daemon and waits for its result.
+
+    Args:
+        args (list): The command line after 'cli.py', e.g. ['complete', 'Exercise'].
+        stdin (str): Text the command reads as its standard input.
+        socket_path (str): Path of the socket. Defaults to SOCKET_PATH.
+
+    Returns:
+        dict: The command's 'stdout', 'stderr' and 'exit_code'.
+
+    Raises:
+        OSError: If no daemon is listening on the socket.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path or SOCKET_PATH)
+        client.sendall(json.dumps({"args": list(args), "stdin": stdin}).encode("utf-8") + b"\n")
+        client.shutdown(socket.SHUT_WR)
+        with client.makefile("rb") as response:
+            return json.loads(response.readline())
@@ -0,0 +1,170 @@
+# File: db.py
+
+import atexit
+import os
+import sqlite3
+import threading
+
+import metrics
+import sql_stats
+
+DB_NAME = 'habits.db'
+
+# Named pragma profiles. 'concurrent' puts the database in WAL mode so readers never block
+# the writer and several processes can share it; 'compatible' keeps SQLite's rollback
+# journal for environments where WAL's shared-memory file is not available.
+PRAGMA_PROFILES = {
+    "concurrent": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -16000,
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+        # Checkpoint policy: fold the WAL back into the database every 1000 pages and
+        # truncate it to at most 64 MiB afterwards
+        "wal_autocheckpoint": 1000,
+        "journal_size_limit": 67108864,
+    },
+    "compatible": {
+        "busy_timeout": 5000,
+        "temp_store": "MEMORY",
+    },
+}
+
+PROFILE = os.environ.get("HABIT_DB_PROFILE", "concurrent")
+
+# Pragmas applied to every new connection, in order. Adjust with use_profile() or configure().
+PRAGMAS = dict(PRAGMA_PROFILES[PROFILE])
+
+_local = threading.local()
+_open_connections = []
+_lock = threading.Lock()
+_generation = 0
+
+CONNECTION_REQUESTS = metrics.register(metrics.Counter(
+    "habit_db_connection_requests_total", "Calls to get_connection, served from the pool or by opening a connection."))
+CONNECTIONS_OPENED = metrics.register(metrics.Counter(
+    "habit_db_connections_opened_total", "Database connections opened by get_connection."))
+OPEN_CONNECTIONS = metrics.register(metrics.Gauge(
+    "habit_db_open_connections", "Pooled database connections currently open, across all threads.",
+    lambda: len(_open_connections)))
+
+def configure(**pragmas):
+    """
+    Updates the pragmas applied to connections opened from now on.
+
+    Args:
+        **pragmas: Pragma names mapped to their values, e.g. cache_size=-8000.
+            A value of None removes the pragma from the profile.
+    """
+    for name, value in pragmas.items():
+        if value is None:
+            PRAGMAS.pop(name, None)
+        else:
+            PRAGMAS[name] = value
+
+def use_profile(name):
+    """
+    Replaces the pragmas applied to connections opened from now on with a named profile.
+
+    Args:
+        name (str): A key of PRAGMA_PROFILES.
+    """
+    if name not in PRAGMA_PROFILES:
+        raise ValueError(f"Unknown pragma profile '{name}'.")
+    PRAGMAS.clear()
+    PRAGMAS.update(PRAGMA_PROFILES[name])
+
+def checkpoint(mode="PASSIVE", db_name=None):
+    """
+    Copies committed WAL content back into the database file. Automatic checkpoints run
+    as the WAL grows; long-running processes can call this when idle, with 'TRUNCATE'
+    to also reset the WAL file.
+
+    Args:
+        mode (str): 'PASSIVE', 'FULL', 'RESTART' or 'TRUNCATE'.
+        db_name (str, optional): Path of the database file. Defaults to DB_NAME.
+
+    Returns:
+        tuple: (busy, wal_pages, checkpointed_pages) as reported by SQLite.
+    """
+    if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+        raise ValueError(f"Unknown checkpoint mode '{mode}'.")
+    return get_connection(db_name).execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+
+def _apply_pragmas(conn):
+    """Applies the configured pragma profile to a freshly opened connection."""
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+
+def get_connection(db_name=None):
+    """
+    Returns the calling thread's pooled connection to the database, opening it on first use.
+
+    Connections are kept per thread and per database file, so repeated calls from the
+    same thread reuse one connection instead of paying connect/teardown each time.
+
+    Args:
+        db_name (str, optional): Path of the database file. Defaults to DB_NAME.
+
+    Returns:
+        sqlite3.Connection: An open connection with the configured pragmas applied. Unless
+            sql_stats is disabled, its statements are timed and counted by sql_stats.
+    """
+    db_name = db_name or DB_NAME
+    CONNECTION_REQUESTS.inc()
+    connections = getattr(_local, "connections", None)
+    if connections is None or _local.generation != _generation:
+        # First use in this thread, or close_all() has invalidated the pool since.
+        connections = _local.connections = {}
+        _local.generation = _generation
+
+    conn = connections.get(db_name)
+    if conn is None:
+        if sql_stats.ENABLED:
+            conn = sqlite3.connect(db_name, factory=sql_stats.InstrumentedConnection)
+        else:
+            conn = sqlite3.connect(db_name)
+        _apply_pragmas(conn)
+        CONNECTIONS_OPENED.inc()
+        connections[db_name] = conn
+        with _lock:
+            _open_connections.append(conn)
+    return conn
+
+def close_connection(db_name=None):
+    """
+    Closes the calling thread's pooled connection to the database, if one is open.
+
+    Args:
+        db_name (str, optional): Path of the database file. Defaults to DB_NAME.
+    """
+    db_name = db_name or DB_NAME
+    connections = getattr(_local, "connections", {})
+    conn = connections.pop(db_name, None)
+    if conn is not None:
+        with _lock:
+            if conn in _open_connections:
+                _open_connections.remove(conn)
+        conn.close()
+
+def close_all():
+    """
+    Closes every pooled connection opened by any thread. Registered to run at interpreter
+    shutdown so pending transactions are not left dangling.
+    """
+    global _generation
+    with _lock:
+        connections = list(_open_connections)
+        _open_connections.clear()
+        _generation += 1
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.ProgrammingError:
+            # Connections created in another thread can only be closed by that thread
+            # on some builds; they are released when the thread's objects are collected.
+            pass
+
+atexit.register(close_all)
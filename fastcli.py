@@ -0,0 +1,47 @@
+# File: fastcli.py
+
+import time
+
+STARTED = time.perf_counter()
+
+import sys
+
+import commands
+
+IMPORTED = time.perf_counter()
+
+def main(argv=None):
+    """
+    Startup-optimized entry point taking the same arguments as cli.py. Plain invocations of
+    the everyday commands run without importing click; everything else, including --help,
+    options and invalid input, is handed to cli.py.
+
+    Args:
+        argv (list): The command line after the program name. Defaults to sys.argv[1:].
+
+    Returns:
+        int: The exit code of the command.
+    """
+    args = sys.argv[1:] if argv is None else list(argv)
+    timing = args[:1] == ['--timing']
+    command = commands.fast_command(args[1:] if timing else args)
+    if command is None:
+        from cli import cli
+        return cli.main(args=args, prog_name='cli.py')
+    if timing:
+        args = args[1:]
+
+    setup_started = time.perf_counter()
+    commands.prepare(args[0])
+    setup_finished = time.perf_counter()
+    command(*args[1:])
+    if timing:
+        print(commands.format_timing([
+            ("imports", IMPORTED - STARTED),
+            ("setup", setup_finished - setup_started),
+            ("command", time.perf_counter() - setup_finished),
+        ]), file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+# File: generate_data.py
+
+import argparse
+import math
+import random
+import sqlite3
+import time
+from datetime import datetime
+
+import db
+import migrations
+from habit_tracker import Habit
+
+# Completion rows buffered before each executemany; every chunk is its own transaction
+CHUNK_SIZE = 100000
+
+def completed_periods(rng, periods, rate, gaps, mean_gap):
+    """
+    Yields the indexes of the periods in which a habit was completed, oldest first.
+
+    Args:
+        rng (random.Random): The random generator to draw from.
+        periods (int): The number of periods in the history.
+        rate (float): The share of periods that are completed.
+        gaps (str): 'bernoulli' completes every period independently with probability
+            rate; 'geometric' alternates runs and gaps of geometrically distributed length,
+            with gaps of mean_gap periods on average and runs long enough to reach rate.
+        mean_gap (float): The average gap length for the 'geometric' distribution.
+    """
+    if gaps == 'bernoulli' or rate <= 0 or rate >= 1:
+        for period in range(periods):
+            if rng.random() < rate:
+                yield period
+        return
+
+    def log_continue(mean):
+        # Log probability that a geometric run with this mean length goes on for another period
+        return math.log(1 - 1 / mean) if mean > 1 else None
+
+    def length(log_p):
+        return 1 if log_p is None else int(math.log(1 - rng.random()) / log_p) + 1
+
+    log_run = log_continue(rate * mean_gap / (1 - rate))
+    log_gap = log_continue(mean_gap)
+
+    # Start inside a run or a gap in proportion to their share of the history
+    period, in_run = 0, rng.random() < rate
+    while period < periods:
+        if in_run:
+            end = min(period + length(log_run), periods)
+            yield from range(period, end)
+        else:
+            end = period + length(log_gap)
+        period, in_run = end, not in_run
+
+def _write_chunk(conn, rows):
+    """Inserts one chunk of completion rows in its own transaction and returns how many were new."""
+    with conn:
+        cursor = conn.executemany("INSERT OR IGNORE INTO completion_days (habit_id, day, time) VALUES (?, ?, ?)", rows)
+    return cursor.rowcount
+
+def generate(db_path, habits, days=365, weekly_share=0.5, rate=0.8, gaps='bernoulli', mean_gap=2.0,
+             seed=42, existing=False, chunk_size=CHUNK_SIZE):
+    """
+    Streams synthetic habits and completion history into a database. Rows are written with
+    executemany in chunked transactions, in (habit, day) order so every insert appends to
+    the completion index.
+
+    Args:
+        db_path (str): Path of the database file; its schema is migrated first.
+        habits (int): Number of habits to create, named 'Habit <n>'.
+        days (int): Length of the completion history in days, ending today.
+        weekly_share (float): The share of new habits that are weekly.
+        rate (float): The share of periods (days or weeks) in which a habit is completed.
+        gaps (str): How missed periods are distributed, 'bernoulli' or 'geometric'.
+            See completed_periods.
+        mean_gap (float): The average gap length for 'geometric' gaps.
+        seed (int): Seed for the random generator, so runs are reproducible.
+        existing (bool): Also generate history for the habits already in the database.
+        chunk_size (int): Completion rows written per transaction.
+
+    Returns:
+        int: The number of completion rows written; rows for days a habit was already
+            completed on, with existing=True, are skipped and not counted.
+    """
+    rng = random.Random(seed)
+    today = datetime.now().date().toordinal()
+    created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    conn = sqlite3.connect(db_path)
+    try:
+        migrations.migrate(conn)
+        # The data is disposable until the load finishes, so skip the per-commit fsync
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA cache_size = -64000")
+
+        targets = []
+        if existing:
+            targets = conn.execute("SELECT id, periodicity FROM habits ORDER BY id").fetchall()
+        first = conn.execute("SELECT COUNT(*) FROM habits").fetchone()[0]
+        with conn:
+            for index in range(habits):
+                # Spreads weekly habits evenly, e.g. every other habit for a share of 0.5
+                weekly = math.floor((index + 1) * weekly_share) > math.floor(index * weekly_share)
+                periodicity = "weekly" if weekly else "daily"
+                habit_id = conn.execute(
+                    "INSERT INTO habits (name, periodicity, created_at, streak) VALUES (?, ?, ?, 0)",
+                    (f"Habit {first + index}", periodicity, created_at)
+                ).lastrowid
+                targets.append((habit_id, periodicity))
+
+        rows = []
+        written = 0
+        for habit_id, periodicity in targets:
+            step = 7 if periodicity == "weekly" else 1
+            periods = (days + step - 1) // step
+            completion_time = f"{rng.randrange(6, 22):02d}:00:00"
+            # Period 0 is the oldest; the last period ends today
+            for period in completed_periods(rng, periods, rate, gaps, mean_gap):
+                rows.append((habit_id, today - (periods - 1 - period) * step, completion_time))
+            if len(rows) >= chunk_size:
+                written += _write_chunk(conn, rows)
+                rows = []
+        written += _write_chunk(conn, rows)
+    finally:
+        conn.close()
+    return written
+
+def main():
+    """Generates synthetic data into a database and recomputes the streaks of every habit."""
+    parser = argparse.ArgumentParser(description="Generate synthetic habits and completion history.")
+    parser.add_argument("--database", default=db.DB_NAME, help="database file to write to")
+    parser.add_argument("--habits", type=int, default=1000, help="number of habits to create")
+    parser.add_argument("--weekly-share", type=float, default=0.5, help="share of new habits that are weekly")
+    parser.add_argument("--days", type=int, default=365, help="days of history, ending today")
+    parser.add_argument("--rate", type=float, default=0.8, help="share of periods that are completed")
+    parser.add_argument("--gaps", choices=["bernoulli", "geometric"], default="bernoulli",
+                        help="distribution of missed periods")
+    parser.add_argument("--mean-gap", type=float, default=2.0, help="average gap length for --gaps geometric")
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+    parser.add_argument("--existing", action="store_true",
+                        help="also generate history for the habits already in the database")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="completion rows per transaction")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    completions = generate(args.database, args.habits, args.days, args.weekly_share, args.rate, args.gaps,
+                           args.mean_gap, args.seed, args.existing, args.chunk_size)
+    print(f"Wrote {completions} completions in {time.perf_counter() - start:.1f} s.")
+
+    db.DB_NAME = args.database
+    start = time.perf_counter()
+    Habit.update_all_streaks(full=True)
+    print(f"Recomputed streaks in {time.perf_counter() - start:.1f} s.")
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,124 @@
 # File: habit_tracker.py
 
-import sqlite3
-from datetime import datetime, timedelta
+import bisect
+import os
+from datetime import date, datetime, time
 
-DB_NAME = 'habits.db'
+import metrics
+import migrations
+import streaks_sql
+from db import get_connection
+
+# Backend used by Habit.update_all_streaks: 'python' folds each habit's history in
+# Python, 'sql' recomputes all stale habits in one set-based statement, 'numpy'
+# (requires numpy) computes them with vectorized array operations, and 'bitmap' scans
+# the per-habit completion bitmaps of bitmaps.py
+STREAK_ENGINE = os.environ.get("HABIT_STREAK_ENGINE", "python")
+
+# Streak state of a habit without completions: (run_start, run_end, run_length, best_streak)
+EMPTY_RUN = (None, None, 0, 0)
+
+# The 'habits' columns Habit.from_row builds a habit from, in order
+HABIT_COLUMNS = "name, periodicity, created_at, streak, best_streak"
+
+COMPLETIONS_WRITTEN = metrics.register(metrics.Counter(
+    "habit_completions_written_total", "Completions written by complete_task and complete_many."))
+# 'full' rebuilds a streak from the completion history; 'incremental' advances or lapses the
+# stored run without reading it
+STREAK_RECOMPUTATIONS = metrics.register(metrics.Counter(
+    "habit_streak_recomputations_total", "Habit streaks recomputed, by kind and streak engine.",
+    labels=("kind", "engine")))
+
+def period_index(day, periodicity):
+    """
+    Maps a day ordinal to the period it belongs to: the day itself for daily habits,
+    or the Monday-based calendar week for weekly habits.
+
+    Args:
+        day (int): The date as returned by date.toordinal().
+        periodicity (str): The frequency of the habit ('daily' or 'weekly').
+
+    Returns:
+        int: The period number; consecutive periods differ by exactly 1.
+    """
+    if periodicity == "weekly":
+        # Ordinal 1 (0001-01-01) is a Monday
+        return (day - 1) // 7
+    return day
+
+def advance_run(run, day, periodicity):
+    """
+    Folds one completion into a habit's streak state. Completions must be fed in
+    ascending date order.
+
+    Args:
+        run (tuple): The current (run_start, run_end, run_length, best_streak) state.
+        day (int): The day ordinal of the completion, not earlier than run_end.
+        periodicity (str): The frequency of the habit ('daily' or 'weekly').
+
+    Returns:
+        tuple: The updated (run_start, run_end, run_length, best_streak) state.
+    """
+    run_start, run_end, run_length, best_streak = run
+    period = period_index(day, periodicity)
+    if run_end is None or period > period_index(run_end, periodicity) + 1:
+        # A period was skipped, so a new run begins with this completion
+        run_start, run_length = day, 1
+    elif period == period_index(run_end, periodicity) + 1:
+        run_length += 1
+    return run_start, day, run_length, max(best_streak, run_length)
+
+def current_streak(run_end, run_length, periodicity, today):
+    """
+    Returns the length of the latest run if it is still alive, i.e. it reaches the
+    current or the previous period, and 0 otherwise.
+
+    Args:
+        run_end (int or None): Day ordinal of the last completion in the latest run.
+        run_length (int): Number of periods in the latest run.
+        periodicity (str): The frequency of the habit ('daily' or 'weekly').
+        today (int): Day ordinal of the current date.
+    """
+    if run_end is None:
+        return 0
+    if period_index(today, periodicity) - period_index(run_end, periodicity) > 1:
+        return 0
+    return run_length
+
+def _batch_row(record, now):
+    """
+    Validates a complete_many record and converts it to a (name, day, time) row.
+
+    Args:
+        record (tuple): (name, date) or (name, date, time), see Habit.complete_many.
+        now (datetime): The current time, used for a missing date or time.
+
+    Returns:
+        tuple: (name, day ordinal, 'HH:MM:SS' time).
+
+    Raises:
+        ValueError: If the name is missing or the date or time is not a valid ISO value.
+    """
+    name, completion_date = record[0], record[1]
+    if not isinstance(name, str) or not name:
+        raise ValueError("missing habit name")
+    if completion_date is None:
+        completion_date = now
+    elif isinstance(completion_date, str):
+        try:
+            completion_date = datetime.fromisoformat(completion_date)
+        except ValueError as error:
+            raise ValueError(f"invalid date '{completion_date}': {error}") from None
+    elif not isinstance(completion_date, date):
+        raise ValueError(f"invalid date {completion_date!r}")
+
+    completion_time = record[2] if len(record) > 2 else None
+    if not completion_time:
+        return name, completion_date.toordinal(), now.strftime("%H:%M:%S")
+    try:
+        return name, completion_date.toordinal(), time.fromisoformat(completion_time).strftime("%H:%M:%S")
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid time '{completion_time}'") from None
 
 class Habit:
     """
@@ -14,61 +129,93 @@ class Habit:
         periodicity (str): The frequency of the habit ('daily' or 'weekly').
         created_at (datetime): The creation date of the habit.
         streak (int): The current streak count of the habit.
+        best_streak (int): The longest streak the habit has ever reached.
     """
 
+    # No per-instance __dict__, so registries holding many habits stay small
+    __slots__ = ("name", "periodicity", "created_at", "streak", "best_streak")
+
     def __init__(self, name, periodicity, created_at=None):
         self.name = name
         self.periodicity = periodicity
         self.created_at = created_at or datetime.now()
         self.streak = 0
+        self.best_streak = 0
+
+    @classmethod
+    def from_row(cls, row):
+        """
+        Builds a habit from a stored row without going through __init__.
+
+        Args:
+            row (tuple): (name, periodicity, created_at, streak, best_streak) as read from
+                the 'habits' table, see HABIT_COLUMNS.
+
+        Returns:
+            Habit: The habit with its stored streak state.
+        """
+        habit = object.__new__(cls)
+        habit.name, habit.periodicity, created_at, streak, best_streak = row
+        habit.created_at = datetime.fromisoformat(created_at) if created_at else None
+        habit.streak = streak or 0
+        habit.best_streak = best_streak or 0
+        return habit
 
     def save(self):
         """Saves the habit to the database if it does not already exist."""
-        with sqlite3.connect(DB_NAME) as conn:
+        conn = get_connection()
+        with conn:
             cursor = conn.cursor()
+            # A new habit has no completions, so its empty streak state is already current
             cursor.execute(
-                "INSERT OR IGNORE INTO habits (name, periodicity, created_at, streak) VALUES (?, ?, ?, ?)",
-                (self.name, self.periodicity, self.created_at.strftime("%Y-%m-%d %H:%M:%S"), self.streak)
+                """
+                INSERT OR IGNORE INTO habits (name, periodicity, created_at, streak, streak_as_of, run_length, best_streak)
+                VALUES (?, ?, ?, ?, ?, 0, 0)
+                """,
+                (self.name, self.periodicity, self.created_at.strftime("%Y-%m-%d %H:%M:%S"), self.streak,
+                 datetime.now().date().isoformat())
             )
-            conn.commit()
 
     def exists_in_db(self):
         """Checks if the habit exists in the database."""
-        with sqlite3.connect(DB_NAME) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT 1 FROM habits WHERE name = ?", (self.name,))
-            return cursor.fetchone() is not None
+        cursor = get_connection().cursor()
+        cursor.execute("SELECT 1 FROM habits WHERE name = ?", (self.name,))
+        return cursor.fetchone() is not None
 
     def delete(self):
         """Deletes the habit and all associated completion records from the database."""
-        with sqlite3.connect(DB_NAME) as conn:
+        conn = get_connection()
+        with conn:
             cursor = conn.cursor()
+            # The habits_delete_completions trigger removes the completion records
             cursor.execute("DELETE FROM habits WHERE name = ?", (self.name,))
-            cursor.execute("DELETE FROM completions WHERE habit_name = ?", (self.name,))
-            conn.commit()
 
     def is_completed_today(self):
         """Checks if the habit has been completed today."""
-        today_date = datetime.now().date().isoformat()
-        with sqlite3.connect(DB_NAME) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT 1 FROM completions WHERE habit_name = ? AND date = ?", (self.name, today_date))
-            return cursor.fetchone() is not None
+        today = datetime.now().date().toordinal()
+        cursor = get_connection().cursor()
+        cursor.execute("SELECT last_completed_day FROM habits WHERE name = ?", (self.name,))
+        row = cursor.fetchone()
+        if row is None or row[0] is None or row[0] < today:
+            return False
+        if row[0] == today:
+            return True
+        # Completions were recorded for future dates, so today has to be looked up
+        cursor.execute(
+            "SELECT 1 FROM completion_days WHERE habit_id = (SELECT id FROM habits WHERE name = ?) AND day = ?",
+            (self.name, today)
+        )
+        return cursor.fetchone() is not None
 
     def is_completed_within_7_days(self):
         """Checks if the habit has been completed within the last 7 days."""
-        today = datetime.now().date()
-        with sqlite3.connect(DB_NAME) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT date FROM completions WHERE habit_name = ? ORDER BY date DESC LIMIT 1",
-                (self.name,)
-            )
-            last_completion = cursor.fetchone()
-            if last_completion:
-                last_completion_date = datetime.strptime(last_completion[0], "%Y-%m-%d").date()
-                return (today - last_completion_date).days < 7
-            return False
+        today = datetime.now().date().toordinal()
+        cursor = get_connection().cursor()
+        cursor.execute("SELECT last_completed_day FROM habits WHERE name = ?", (self.name,))
+        row = cursor.fetchone()
+        if row is not None and row[0] is not None:
+            return today - row[0] < 7
+        return False
 
     def complete_task(self, date=None):
         """
@@ -76,98 +223,284 @@ class Habit:
 
         Args:
             date (datetime, optional): The date of completion. Defaults to today.
+
+        Returns:
+            bool: True if the completion was recorded, False if the habit does not exist or
+                was already completed in the period.
         """
         if self.periodicity == "weekly":
             if self.is_completed_within_7_days():
                 print(f"Habit '{self.name}' has already been completed within the last 7 days.")
-                return
+                return False
         elif self.periodicity == "daily" and self.is_completed_today() and date is None:
             print(f"Habit '{self.name}' has already been completed today.")
-            return
+            return False
 
-        completion_date = (date or datetime.now()).date().isoformat()
+        completion_date = (date or datetime.now()).date()
         completion_time = datetime.now().strftime("%H:%M:%S")
-        with sqlite3.connect(DB_NAME) as conn:
+        day = completion_date.toordinal()
+        conn = get_connection()
+        with conn:
             cursor = conn.cursor()
-            cursor.execute("INSERT INTO completions (habit_name, date, time) VALUES (?, ?, ?)", 
-                           (self.name, completion_date, completion_time))
-            conn.commit()
+            # Lock out other writers before reading the streak state, so the incremental
+            # update cannot race with a completion written by another process
+            cursor.execute("BEGIN IMMEDIATE")
+            # Read the stored streak state before the insert trigger marks it stale
+            cursor.execute(
+                "SELECT id, run_start, run_end, run_length, best_streak, streak_as_of FROM habits WHERE name = ?",
+                (self.name,)
+            )
+            state = cursor.fetchone()
+            if state is None:
+                print(f"Habit '{self.name}' does not exist.")
+                return False
+            habit_id, run, streak_as_of = state[0], state[1:5], state[5]
+            cursor.execute("INSERT INTO completion_days (habit_id, day, time) VALUES (?, ?, ?)",
+                           (habit_id, day, completion_time))
+
+            # Appending after the latest completion extends the stored state in constant time;
+            # a backfill or a state that is already stale needs a full rebuild
+            incremental = streak_as_of is not None and (run[1] is None or day > run[1])
+            if incremental:
+                self._store_run(cursor, advance_run(run, day, self.periodicity))
+        COMPLETIONS_WRITTEN.inc()
+        if incremental:
+            STREAK_RECOMPUTATIONS.inc(kind="incremental", engine="python")
+        if not incremental:
             self.update_streak()
+        return True
 
     def update_streak(self):
         """
-        Updates the streak for the habit based on consecutive completion dates.
-        Resets the streak if the periodicity pattern is broken.
+        Rebuilds the streak state for the habit from its full completion history.
+        Resets the current streak if the periodicity pattern is broken, and records
+        the longest run seen along the way.
         """
-        with sqlite3.connect(DB_NAME) as conn:
+        conn = get_connection()
+        with conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT date FROM completions WHERE habit_name = ? ORDER BY date ASC", (self.name,))
-            dates = [datetime.strptime(row[0], "%Y-%m-%d").date() for row in cursor.fetchall()]
-            
-            self.streak = 0
-            if not dates:
-                return
-
-            # Start the streak with the first completion date
-            self.streak = 1
-            expected_date = dates[0]
-            
-            for date in dates[1:]:
-                if self.periodicity == "daily":
-                    if date == expected_date + timedelta(days=1):
-                        self.streak += 1
-                        expected_date = date
-                    else:
-                        break
-                elif self.periodicity == "weekly":
-                    # Check only day-level granularity (7 days apart)
-                    if (date - expected_date).days >= 7:
-                        self.streak += 1
-                        expected_date = date
-                    else:
-                        break
-
-            cursor.execute("UPDATE habits SET streak = ? WHERE name = ?", (self.streak, self.name))
-            conn.commit()
+            cursor.execute(
+                "SELECT day FROM completion_days WHERE habit_id = (SELECT id FROM habits WHERE name = ?) ORDER BY day ASC",
+                (self.name,)
+            )
+            run = EMPTY_RUN
+            for (day,) in cursor.fetchall():
+                run = advance_run(run, day, self.periodicity)
+            self._store_run(cursor, run)
+        STREAK_RECOMPUTATIONS.inc(kind="full", engine="python")
+
+    def _store_run(self, cursor, run):
+        """
+        Persists a streak state for the habit and stamps it as computed today.
+
+        Args:
+            cursor: The cursor of the transaction to write in.
+            run (tuple): The (run_start, run_end, run_length, best_streak) state.
+        """
+        run_start, run_end, run_length, best_streak = run
+        today = datetime.now().date()
+        self.streak = current_streak(run_end, run_length, self.periodicity, today.toordinal())
+        self.best_streak = best_streak
+        # Stamp the recomputation so update_all_streaks can skip this habit until
+        # its completions change again
+        cursor.execute(
+            """
+            UPDATE habits
+            SET streak = ?, streak_as_of = ?, run_start = ?, run_end = ?, run_length = ?, best_streak = ?
+            WHERE name = ?
+            """,
+            (self.streak, today.isoformat(), run_start, run_end, run_length, best_streak, self.name)
+        )
 
     @staticmethod
-    def update_all_streaks():
+    def complete_many(records):
         """
-        Updates streaks for all habits to ensure they are current.
-        Loops through each habit, instantiates it, and calls update_streak.
-        This ensures that any stale streak data is updated.
+        Marks many habits as completed in a single transaction. Records for unknown habits,
+        dates a daily habit is already completed on, and weekly completions less than
+        7 days from another completion of the same habit are skipped. Streaks are then
+        recomputed once per affected habit.
+
+        Args:
+            records (iterable): (name, date) or (name, date, time) tuples. The date may be a
+                date, a datetime, an ISO date string, or None for today; the time defaults
+                to the current time.
+
+        Returns:
+            dict: Counts of 'completed' and 'skipped' records, the sorted list of 'unknown'
+                habit names, and the 'invalid' records as (position, reason) pairs, where
+                position is the record's index in records. Invalid records are skipped.
         """
-        with sqlite3.connect(DB_NAME) as conn:
+        now = datetime.now()
+        rows = []
+        invalid = []
+        # Every record is validated before the transaction opens, so one malformed record
+        # is skipped instead of rolling back the whole batch
+        for position, record in enumerate(records):
+            try:
+                rows.append(_batch_row(record, now))
+            except (TypeError, ValueError) as error:
+                invalid.append((position, str(error)))
+
+        conn = get_connection()
+        with conn:
             cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("CREATE TEMP TABLE batch_completions (name TEXT, day INTEGER, time TEXT)")
+            try:
+                cursor.executemany("INSERT INTO batch_completions (name, day, time) VALUES (?, ?, ?)", rows)
+                cursor.execute("""
+                    SELECT DISTINCT b.name
+                    FROM batch_completions b
+                    LEFT JOIN habits h ON h.name = b.name
+                    WHERE h.id IS NULL
+                """)
+                unknown = sorted(row[0] for row in cursor.fetchall())
+                cursor.execute("""
+                    SELECT h.id, h.periodicity, b.day, b.time
+                    FROM batch_completions b
+                    JOIN habits h ON h.name = b.name
+                    ORDER BY h.id, b.day
+                """)
+                candidates = cursor.fetchall()
+
+                # Existing completions near the batch dates of each weekly habit, fetched at once
+                cursor.execute("""
+                    SELECT c.habit_id, c.day
+                    FROM (
+                        SELECT h.id, MIN(b.day) AS first_day, MAX(b.day) AS last_day
+                        FROM batch_completions b
+                        JOIN habits h ON h.name = b.name
+                        WHERE h.periodicity = 'weekly'
+                        GROUP BY h.id
+                    ) w
+                    JOIN completion_days c ON c.habit_id = w.id AND c.day BETWEEN w.first_day - 6 AND w.last_day + 6
+                    ORDER BY c.habit_id, c.day
+                """)
+                taken = {}
+                for habit_id, day in cursor.fetchall():
+                    taken.setdefault(habit_id, []).append(day)
+            finally:
+                cursor.execute("DROP TABLE temp.batch_completions")
+
+            accepted = []
+            for habit_id, periodicity, day, completion_time in candidates:
+                if periodicity == "weekly":
+                    days = taken.setdefault(habit_id, [])
+                    position = bisect.bisect_left(days, day)
+                    neighbours = days[max(position - 1, 0):position + 1]
+                    if any(abs(day - other) < 7 for other in neighbours):
+                        continue
+                    days.insert(position, day)
+                accepted.append((habit_id, day, completion_time))
+
+            # Duplicate days are skipped by the primary key; the insert triggers mark every
+            # affected habit's streak as stale
+            cursor.executemany("INSERT OR IGNORE INTO completion_days (habit_id, day, time) VALUES (?, ?, ?)", accepted)
+            completed = max(cursor.rowcount, 0)
+        COMPLETIONS_WRITTEN.inc(completed)
+
+        Habit.update_all_streaks()
+        skipped = len(rows) - completed + len(invalid)
+        return {"completed": completed, "skipped": skipped, "unknown": unknown, "invalid": invalid}
+
+    @staticmethod
+    def update_all_streaks(engine=None, full=False):
+        """
+        Updates streaks for all habits whose stored streak may be out of date.
+        A habit is stale when its 'streak_as_of' stamp has been cleared, which the
+        completion triggers do whenever a completion is added or removed, so
+        habits with unchanged history are skipped. Habits with an ongoing streak
+        stamped on an earlier day are re-checked in case the streak has lapsed since.
+
+        Args:
+            engine (str, optional): The backend to use, 'python', 'sql', 'numpy' or 'bitmap'.
+                Defaults to STREAK_ENGINE.
+            full (bool): Rebuild every habit from its history, not only the stale ones.
+        """
+        engine = engine or STREAK_ENGINE
+        conn = get_connection()
+        if engine == "sql":
+            STREAK_RECOMPUTATIONS.inc(streaks_sql.update_all_streaks(conn, full=full), kind="full", engine="sql")
+            return
+        if engine == "numpy":
+            # Imported on demand so numpy stays an optional dependency
+            import streaks_numpy
+            STREAK_RECOMPUTATIONS.inc(streaks_numpy.update_all_streaks(conn, full=full), kind="full", engine="numpy")
+            return
+        if engine == "bitmap":
+            import bitmaps
+            STREAK_RECOMPUTATIONS.inc(bitmaps.update_all_streaks(conn, full=full), kind="full", engine="bitmap")
+            return
+        if engine != "python":
+            raise ValueError(f"Unknown streak engine '{engine}'.")
+
+        cursor = conn.cursor()
+        if full:
             cursor.execute("SELECT name, periodicity FROM habits")
-            habits = cursor.fetchall()
+        else:
+            cursor.execute("SELECT name, periodicity FROM habits WHERE streak_as_of IS NULL")
+        habits = cursor.fetchall()
+
+        for name, periodicity in habits:
+            habit = Habit(name, periodicity)
+            habit.update_streak()
+
+        # Lapsed streaks can be detected from the stored run without reading completions
+        today = datetime.now().date()
+        cursor.execute(
+            "SELECT name, periodicity, run_end, run_length FROM habits WHERE streak > 0 AND streak_as_of < ?",
+            (today.isoformat(),)
+        )
+        refreshed = [
+            (current_streak(run_end, run_length, periodicity, today.toordinal()), today.isoformat(), name)
+            for name, periodicity, run_end, run_length in cursor.fetchall()
+        ]
+        if refreshed:
+            with conn:
+                conn.executemany("UPDATE habits SET streak = ?, streak_as_of = ? WHERE name = ?", refreshed)
+            STREAK_RECOMPUTATIONS.inc(len(refreshed), kind="incremental", engine="python")
 
-            for name, periodicity in habits:
-                habit = Habit(name, periodicity)
-                habit.update_streak()
+class Completion:
+    """
+    One completion of a habit, as stored in 'completion_days'.
+
+    Attributes:
+        habit_id (int): The id of the completed habit.
+        day (int): The completion date as returned by date.toordinal().
+        time (str): The time of day of the completion, 'HH:MM:SS'.
+    """
+
+    __slots__ = ("habit_id", "day", "time")
+
+    def __init__(self, habit_id, day, time):
+        self.habit_id = habit_id
+        self.day = day
+        self.time = time
+
+    @classmethod
+    def from_row(cls, row):
+        """Builds a completion from a (habit_id, day, time) row."""
+        completion = object.__new__(cls)
+        completion.habit_id, completion.day, completion.time = row
+        return completion
+
+    @property
+    def date(self):
+        """The completion date as a datetime.date."""
+        return date.fromordinal(self.day)
+
+    def __eq__(self, other):
+        if not isinstance(other, Completion):
+            return NotImplemented
+        return (self.habit_id, self.day, self.time) == (other.habit_id, other.day, other.time)
+
+    def __repr__(self):
+        return f"Completion(habit_id={self.habit_id!r}, day={self.day!r}, time={self.time!r})"
 
 def setup_database():
     """
-    Initializes the database tables for habits and completions if they don't already exist.
-    Ensures that 'habits' and 'completions' tables are created with necessary fields.
+    Initializes the database tables for habits and completions if they don't already exist,
+    by applying any pending schema migrations. Does nothing beyond reading the schema version
+    when the database is already current.
     """
-    with sqlite3.connect(DB_NAME) as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS habits (
-                name TEXT PRIMARY KEY,
-                periodicity TEXT,
-                created_at TEXT,
-                streak INTEGER
-            )
-        """)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS completions (
-                habit_name TEXT,
-                date TEXT,
-                time TEXT,
-                FOREIGN KEY (habit_name) REFERENCES habits (name),
-                PRIMARY KEY (habit_name, date)
-            )
-        """)
-        conn.commit()
+    migrations.migrate(get_connection())
@@ -0,0 +1,239 @@
+# File: metrics.py
+
+import threading
+import time
+
+# Content type of the Prometheus text exposition format rendered by render()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Histogram bucket upper bounds in seconds, from sub-millisecond lookups to slow scans
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_registry = []
+_lock = threading.Lock()
+
+def _label_text(names, values, extra=""):
+    """Formats label pairs as '{name="value",...}', or '' when there are none."""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """A value that only goes up, kept per combination of label values."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        """
+        Args:
+            name (str): The metric name, ending in '_total' by convention.
+            help_text (str): One line describing the metric.
+            labels (tuple): Names of the labels each increment is given values for.
+        """
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        # A counter without labels is reported as 0 before its first increment
+        self._values = {} if self.labels else {(): 0}
+
+    def inc(self, amount=1, **labels):
+        """
+        Adds to the counter.
+
+        Args:
+            amount (int or float): How much to add; must not be negative.
+            **labels: A value for every label name of the metric.
+        """
+        key = tuple(labels[name] for name in self.labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        """Returns the current value for one combination of label values."""
+        return self._values.get(tuple(labels[name] for name in self.labels), 0)
+
+    def samples(self):
+        with _lock:
+            values = sorted(self._values.items())
+        return [(self.name, _label_text(self.labels, key), value) for key, value in values]
+
+    def clear(self):
+        with _lock:
+            self._values = {} if self.labels else {(): 0}
+
+class Gauge:
+    """A value read from a callback every time the metrics are rendered."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, read):
+        """
+        Args:
+            name (str): The metric name.
+            help_text (str): One line describing the metric.
+            read (callable): Returns the current value.
+        """
+        self.name = name
+        self.help = help_text
+        self.read = read
+
+    def samples(self):
+        return [(self.name, "", self.read())]
+
+    def clear(self):
+        pass
+
+class Histogram:
+    """Observed durations counted into cumulative buckets, kept per combination of label values."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        """
+        Args:
+            name (str): The metric name, ending in '_seconds' for durations.
+            help_text (str): One line describing the metric.
+            labels (tuple): Names of the labels each observation is given values for.
+            buckets (tuple): Ascending bucket upper bounds; +Inf is added automatically.
+        """
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._values = {}
+
+    def observe(self, seconds, **labels):
+        """
+        Records one observation.
+
+        Args:
+            seconds (float): The observed duration.
+            **labels: A value for every label name of the metric.
+        """
+        key = tuple(labels[name] for name in self.labels)
+        with _lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            counts = entry[0]
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[index] += 1
+                    break
+            entry[1] += 1
+            entry[2] += seconds
+
+    def time(self, **labels):
+        """
+        Returns a decorator that observes how long every call of a function takes.
+
+        Args:
+            **labels: A value for every label name of the metric.
+        """
+        def decorator(function):
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - start, **labels)
+            timed.__name__ = function.__name__
+            timed.__doc__ = function.__doc__
+            timed.__wrapped__ = function
+            return timed
+        return decorator
+
+    def count(self, **labels):
+        """Returns the number of observations for one combination of label values."""
+        entry = self._values.get(tuple(labels[name] for name in self.labels))
+        return entry[1] if entry else 0
+
+    def samples(self):
+        with _lock:
+            values = sorted((key, [list(entry[0]), entry[1], entry[2]]) for key, entry in self._values.items())
+        samples = []
+        for key, (counts, count, total) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _label_text(self.labels, key, f'le="{_number(bound)}"')
+                samples.append((f"{self.name}_bucket", labels, cumulative))
+            samples.append((f"{self.name}_count", _label_text(self.labels, key), count))
+            samples.append((f"{self.name}_sum", _label_text(self.labels, key), total))
+        return samples
+
+    def clear(self):
+        with _lock:
+            self._values.clear()
+
+def register(metric):
+    """
+    Adds a metric to the ones render() reports and returns it, e.g.
+    COMPLETIONS = metrics.register(metrics.Counter("..._total", "...")).
+    """
+    _registry.append(metric)
+    return metric
+
+def render():
+    """
+    Renders every registered metric in the Prometheus text exposition format.
+
+    Returns:
+        str: The exposition, one '# HELP' and '# TYPE' header per metric followed by its samples.
+    """
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+def reset():
+    """Clears the values of every registered counter and histogram."""
+    for metric in _registry:
+        metric.clear()
+
+def start_http_server(port, host="127.0.0.1"):
+    """
+    Serves render() at http://host:port/metrics from a background thread, for Prometheus
+    to scrape.
+
+    Args:
+        port (int): The TCP port to listen on; 0 picks a free one.
+        host (str): The address to bind. Defaults to the loopback interface only.
+
+    Returns:
+        http.server.ThreadingHTTPServer: The running server; call shutdown() to stop it.
+    """
+    # Imported on demand so commands that never serve metrics do not pay for http.server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Scrapes every few seconds would otherwise flood the daemon's output
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,417 @@
+# File: migrations.py
+
+from db import get_connection
+
+# Julian day number of 0000-12-31, so julianday(date) - offset equals date.toordinal()
+JULIAN_DAY_OFFSET = 1721424.5
+
+# Ordered list of (version, description, upgrade function). A database's PRAGMA user_version
+# records the last version applied to it.
+MIGRATIONS = []
+
+def migration(version, description):
+    """
+    Registers an upgrade step. Steps must be registered in increasing version order.
+
+    Args:
+        version (int): The schema version the step upgrades the database to.
+        description (str): A short summary shown when the step is applied.
+    """
+    def register(upgrade):
+        if MIGRATIONS and MIGRATIONS[-1][0] >= version:
+            raise ValueError(f"Migration {version} is registered out of order.")
+        MIGRATIONS.append((version, description, upgrade))
+        return upgrade
+    return register
+
+def latest_version():
+    """Returns the schema version the registered migrations lead to."""
+    return MIGRATIONS[-1][0] if MIGRATIONS else 0
+
+def current_version(conn):
+    """
+    Returns the schema version recorded in the database.
+
+    Args:
+        conn (sqlite3.Connection): The connection to inspect.
+    """
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn, target=None):
+    """
+    Applies every pending upgrade step in order. Each step runs in its own transaction
+    together with the user_version bump, so an interrupted upgrade leaves the database
+    at the last completed version.
+
+    Args:
+        conn (sqlite3.Connection): The connection to upgrade.
+        target (int, optional): Stop after this version. Defaults to the latest version.
+
+    Returns:
+        list of int: The versions that were applied, empty if the schema was already current.
+    """
+    target = latest_version() if target is None else target
+    version = current_version(conn)
+    applied = []
+    for step_version, _, upgrade in MIGRATIONS:
+        if step_version <= version or step_version > target:
+            continue
+        with conn:
+            cursor = conn.cursor()
+            # Take the write lock up front and re-read the version under it, so concurrent
+            # processes starting on an old schema apply each step exactly once
+            cursor.execute("BEGIN IMMEDIATE")
+            if current_version(conn) >= step_version:
+                continue
+            upgrade(cursor)
+            cursor.execute(f"PRAGMA user_version = {int(step_version)}")
+        applied.append(step_version)
+    return applied
+
+def _add_column_if_missing(cursor, table, column, declaration):
+    """
+    Adds a column to an existing table, for databases created before the column was introduced.
+
+    Args:
+        cursor: The cursor to run the schema change with.
+        table (str): The table to alter.
+        column (str): The name of the column to add.
+        declaration (str): The column type and constraints.
+
+    Returns:
+        bool: True if the column was added, False if it already existed.
+    """
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column in {row[1] for row in cursor.fetchall()}:
+        return False
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+    return True
+
+# Databases created before versioning report user_version 0 whatever their layout, so the
+# early steps check for existing objects instead of assuming an empty database.
+
+@migration(1, "Create the habits and completions tables")
+def _create_tables(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS habits (
+            name TEXT PRIMARY KEY,
+            periodicity TEXT,
+            created_at TEXT,
+            streak INTEGER
+        )
+    """)
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'completions'")
+    if cursor.fetchone() is None:
+        cursor.execute("""
+            CREATE TABLE completions (
+                habit_name TEXT,
+                date TEXT,
+                time TEXT,
+                FOREIGN KEY (habit_name) REFERENCES habits (name),
+                PRIMARY KEY (habit_name, date)
+            )
+        """)
+
+@migration(2, "Track when each habit's streak was last computed")
+def _add_streak_as_of(cursor):
+    _add_column_if_missing(cursor, "habits", "streak_as_of", "TEXT")
+
+@migration(3, "Persist the latest run and the best streak of each habit")
+def _add_run_state(cursor):
+    added = [
+        _add_column_if_missing(cursor, "habits", column, "INTEGER")
+        for column in ("run_start", "run_end", "run_length", "best_streak")
+    ]
+    if any(added):
+        # Stored streaks predate the run state; force a full rebuild of every habit
+        cursor.execute("UPDATE habits SET streak_as_of = NULL")
+
+@migration(4, "Store completion dates as integer day ordinals")
+def _store_day_ordinals(cursor):
+    # The primary key doubles as the covering index for per-habit day lookups and range scans
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS completion_days (
+            habit_name TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            time TEXT,
+            FOREIGN KEY (habit_name) REFERENCES habits (name),
+            PRIMARY KEY (habit_name, day)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("SELECT type FROM sqlite_master WHERE name = 'completions'")
+    existing = cursor.fetchone()
+    if existing and existing[0] == "table":
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO completion_days (habit_name, day, time)
+            SELECT habit_name, CAST(julianday(date) - {JULIAN_DAY_OFFSET} AS INTEGER), time
+            FROM completions
+        """)
+        cursor.execute("DROP TABLE completions")
+        cursor.execute("UPDATE habits SET streak_as_of = NULL")
+
+    # The completions view keeps the original text-dated interface for scripts and ad hoc queries
+    cursor.execute(f"""
+        CREATE VIEW IF NOT EXISTS completions AS
+        SELECT habit_name, date(day + {JULIAN_DAY_OFFSET}) AS date, time, day
+        FROM completion_days
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS completions_insert
+        INSTEAD OF INSERT ON completions
+        BEGIN
+            INSERT INTO completion_days (habit_name, day, time)
+            VALUES (NEW.habit_name, CAST(julianday(NEW.date) - {JULIAN_DAY_OFFSET} AS INTEGER), NEW.time);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS completions_delete
+        INSTEAD OF DELETE ON completions
+        BEGIN
+            DELETE FROM completion_days WHERE habit_name = OLD.habit_name AND day = OLD.day;
+        END
+    """)
+
+    # Any change to a habit's completions marks its stored streak as stale
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS completion_days_mark_stale_on_insert
+        AFTER INSERT ON completion_days
+        BEGIN
+            UPDATE habits SET streak_as_of = NULL WHERE name = NEW.habit_name;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS completion_days_mark_stale_on_delete
+        AFTER DELETE ON completion_days
+        BEGIN
+            UPDATE habits SET streak_as_of = NULL WHERE name = OLD.habit_name;
+        END
+    """)
+
+@migration(5, "Key habits by an integer id and reference it from completions")
+def _add_habit_ids(cursor):
+    # SQLite cannot change a primary key in place, so both tables are rebuilt. Existing
+    # rowids become the new ids, and completions of unknown habits are dropped.
+    cursor.execute("""
+        CREATE TABLE habits_new (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            periodicity TEXT,
+            created_at TEXT,
+            streak INTEGER,
+            streak_as_of TEXT,
+            run_start INTEGER,
+            run_end INTEGER,
+            run_length INTEGER,
+            best_streak INTEGER
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO habits_new (id, name, periodicity, created_at, streak, streak_as_of,
+                                run_start, run_end, run_length, best_streak)
+        SELECT rowid, name, periodicity, created_at, streak, streak_as_of,
+               run_start, run_end, run_length, best_streak
+        FROM habits
+    """)
+    cursor.execute("""
+        CREATE TABLE completion_days_new (
+            habit_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            time TEXT,
+            FOREIGN KEY (habit_id) REFERENCES habits (id),
+            PRIMARY KEY (habit_id, day)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        INSERT INTO completion_days_new (habit_id, day, time)
+        SELECT h.id, c.day, c.time
+        FROM completion_days c
+        JOIN habits_new h ON h.name = c.habit_name
+    """)
+
+    # Dropping the view and the tables also drops their triggers
+    cursor.execute("DROP VIEW completions")
+    cursor.execute("DROP TABLE completion_days")
+    cursor.execute("DROP TABLE habits")
+    cursor.execute("ALTER TABLE habits_new RENAME TO habits")
+    cursor.execute("ALTER TABLE completion_days_new RENAME TO completion_days")
+
+    cursor.execute(f"""
+        CREATE VIEW completions AS
+        SELECT h.name AS habit_name, date(c.day + {JULIAN_DAY_OFFSET}) AS date, c.time, c.day
+        FROM completion_days c
+        JOIN habits h ON h.id = c.habit_id
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER completions_insert
+        INSTEAD OF INSERT ON completions
+        BEGIN
+            INSERT INTO completion_days (habit_id, day, time)
+            VALUES ((SELECT id FROM habits WHERE name = NEW.habit_name),
+                    CAST(julianday(NEW.date) - {JULIAN_DAY_OFFSET} AS INTEGER), NEW.time);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER completions_delete
+        INSTEAD OF DELETE ON completions
+        BEGIN
+            DELETE FROM completion_days
+            WHERE habit_id = (SELECT id FROM habits WHERE name = OLD.habit_name) AND day = OLD.day;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER completion_days_mark_stale_on_insert
+        AFTER INSERT ON completion_days
+        BEGIN
+            UPDATE habits SET streak_as_of = NULL WHERE id = NEW.habit_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER completion_days_mark_stale_on_delete
+        AFTER DELETE ON completion_days
+        BEGIN
+            UPDATE habits SET streak_as_of = NULL WHERE id = OLD.habit_id;
+        END
+    """)
+    # Deleting a habit removes its completions, so ids reused later start with a clean history
+    cursor.execute("""
+        CREATE TRIGGER habits_delete_completions
+        AFTER DELETE ON habits
+        BEGIN
+            DELETE FROM completion_days WHERE habit_id = OLD.id;
+        END
+    """)
+
+@migration(6, "Keep the last completion day and completion count on each habit")
+def _add_completion_summary(cursor):
+    _add_column_if_missing(cursor, "habits", "last_completed_day", "INTEGER")
+    _add_column_if_missing(cursor, "habits", "completion_count", "INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("""
+        UPDATE habits
+        SET last_completed_day = (SELECT MAX(day) FROM completion_days WHERE habit_id = habits.id),
+            completion_count = (SELECT COUNT(*) FROM completion_days WHERE habit_id = habits.id)
+    """)
+
+    # The summary is maintained by the same triggers that mark streaks as stale, so every
+    # writer keeps it in step within its own transaction
+    cursor.execute("DROP TRIGGER completion_days_mark_stale_on_insert")
+    cursor.execute("DROP TRIGGER completion_days_mark_stale_on_delete")
+    cursor.execute("""
+        CREATE TRIGGER completion_days_after_insert
+        AFTER INSERT ON completion_days
+        BEGIN
+            UPDATE habits
+            SET streak_as_of = NULL,
+                completion_count = completion_count + 1,
+                last_completed_day = MAX(COALESCE(last_completed_day, NEW.day), NEW.day)
+            WHERE id = NEW.habit_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER completion_days_after_delete
+        AFTER DELETE ON completion_days
+        BEGIN
+            UPDATE habits
+            SET streak_as_of = NULL,
+                completion_count = completion_count - 1,
+                last_completed_day = CASE
+                    WHEN last_completed_day = OLD.day
+                    THEN (SELECT MAX(day) FROM completion_days WHERE habit_id = OLD.habit_id)
+                    ELSE last_completed_day
+                END
+            WHERE id = OLD.habit_id;
+        END
+    """)
+
+@migration(7, "Index the best streak of each habit")
+def _index_best_streak(cursor):
+    # Lets MAX(best_streak) be answered from the end of the index instead of a table scan
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_habits_best_streak ON habits (best_streak)")
+
+@migration(8, "Add completion bitmaps")
+def _add_completion_bitmaps(cursor):
+    # Filled on demand by bitmaps.py; a habit's row is dropped whenever its completions
+    # change, including through habits_delete_completions, so a stored bitmap is never
+    # out of date
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS completion_bitmaps (
+            habit_id INTEGER PRIMARY KEY REFERENCES habits(id),
+            first_day INTEGER NOT NULL,
+            bits BLOB NOT NULL,
+            compressed INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("""
+        CREATE TRIGGER completion_days_drop_bitmap_on_insert
+        AFTER INSERT ON completion_days
+        WHEN EXISTS (SELECT 1 FROM completion_bitmaps WHERE habit_id = NEW.habit_id)
+        BEGIN
+            DELETE FROM completion_bitmaps WHERE habit_id = NEW.habit_id;
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER completion_days_drop_bitmap_on_delete
+        AFTER DELETE ON completion_days
+        WHEN EXISTS (SELECT 1 FROM completion_bitmaps WHERE habit_id = OLD.habit_id)
+        BEGIN
+            DELETE FROM completion_bitmaps WHERE habit_id = OLD.habit_id;
+        END
+    """)
+
+@migration(9, "Default the best streak of each habit to 0")
+def _default_best_streak(cursor):
+    # Habits inserted without a best streak, as by add_predefined_habits.py, would otherwise
+    # report NULL until their first completion. SQLite cannot add a default to an existing
+    # column, so the table is rebuilt and its ids kept.
+    cursor.execute("""
+        CREATE TABLE habits_new (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            periodicity TEXT,
+            created_at TEXT,
+            streak INTEGER,
+            streak_as_of TEXT,
+            run_start INTEGER,
+            run_end INTEGER,
+            run_length INTEGER,
+            best_streak INTEGER NOT NULL DEFAULT 0,
+            last_completed_day INTEGER,
+            completion_count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO habits_new (id, name, periodicity, created_at, streak, streak_as_of, run_start,
+                                run_end, run_length, best_streak, last_completed_day, completion_count)
+        SELECT id, name, periodicity, created_at, streak, streak_as_of, run_start,
+               run_end, run_length, COALESCE(best_streak, 0), last_completed_day, completion_count
+        FROM habits
+    """)
+    # The view and the completion_days triggers name 'habits', which the rename must not
+    # check or rewrite while the table is gone
+    cursor.execute("PRAGMA legacy_alter_table = ON")
+    try:
+        cursor.execute("DROP TABLE habits")
+        cursor.execute("ALTER TABLE habits_new RENAME TO habits")
+    finally:
+        cursor.execute("PRAGMA legacy_alter_table = OFF")
+
+    # Dropping the table also dropped its index and trigger
+    cursor.execute("CREATE INDEX idx_habits_best_streak ON habits (best_streak)")
+    cursor.execute("""
+        CREATE TRIGGER habits_delete_completions
+        AFTER DELETE ON habits
+        BEGIN
+            DELETE FROM completion_days WHERE habit_id = OLD.id;
+        END
+    """)
+
+def main():
+    """Upgrades the database to the latest schema version and reports what was applied."""
+    conn = get_connection()
+    version = current_version(conn)
+    print(f"Schema version: {version} (latest: {latest_version()})")
+    descriptions = {step_version: description for step_version, description, _ in MIGRATIONS}
+    for applied in migrate(conn):
+        print(f"Applied migration {applied}: {descriptions[applied]}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# File: profiling.py
+
+# Profilers behind the CLI's --profile and --trace-memory options. The standard library
+# modules are imported when a profiler starts, so plain invocations never load them.
+
+# Number of allocation sites listed by memory_report
+MEMORY_REPORT_LINES = 10
+
+def start_profile():
+    """
+    Starts a cProfile profiler for the rest of the current thread's work.
+
+    Returns:
+        cProfile.Profile: The enabled profiler, to pass to profile_report.
+    """
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+def profile_report(profiler, sort="cumulative", limit=25, output=None):
+    """
+    Stops a profiler and formats its statistics.
+
+    Args:
+        profiler (cProfile.Profile): A profiler returned by start_profile.
+        sort (str): The pstats sort key, e.g. 'cumulative', 'tottime' or 'calls'.
+        limit (int): The number of functions to list.
+        output (str, optional): Also dump the raw statistics to this file, for pstats,
+            snakeviz or gprof2dot.
+
+    Returns:
+        str: The report, the most expensive functions first.
+    """
+    import io
+    import pstats
+    profiler.disable()
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    if output:
+        # Dumped before strip_dirs so the file keeps full paths
+        stats.dump_stats(output)
+        stream.write(f"Profile written to {output}\n")
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+def start_memory_trace(frames=1):
+    """
+    Starts tracing memory allocations with tracemalloc.
+
+    Args:
+        frames (int): Stack frames kept per allocation.
+    """
+    import tracemalloc
+    tracemalloc.start(frames)
+
+def memory_report(limit=MEMORY_REPORT_LINES):
+    """
+    Stops tracing memory allocations and formats where the memory still held was allocated.
+
+    Args:
+        limit (int): The number of allocation sites to list.
+
+    Returns:
+        str: The current and peak traced memory, followed by the largest allocation sites.
+    """
+    import tracemalloc
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # The import system's own bookkeeping would otherwise crowd out the command's allocations
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ])
+    lines = [f"Memory: {current / 1024:.1f} KiB held at exit, peak {peak / 1024:.1f} KiB",
+             f"Top {limit} allocation sites still holding memory:"]
+    for statistic in snapshot.statistics("lineno")[:limit]:
+        frame = statistic.traceback[0]
+        lines.append(f"  {statistic.size / 1024:10.1f} KiB {statistic.count:8} blocks  {frame.filename}:{frame.lineno}")
+    return "\n".join(lines)
@@ -0,0 +1,247 @@
+# File: repository.py
+
+import threading
+from datetime import datetime
+
+import bitmaps
+from db import get_connection
+from habit_tracker import HABIT_COLUMNS, Habit
+
+_local = threading.local()
+
+class HabitRepository:
+    """
+    An in-memory registry of habits keyed by name, with their stored periodicity and streak.
+
+    Lookups are served from memory once a habit has been read. Writes made through the
+    repository update the database and the registry together. Any other change empties
+    the registry:
+    - a commit by another connection or process, which SQLite reports through
+      PRAGMA data_version;
+    - a write on this thread's connection that bypassed the repository, such as a streak
+      refresh, which shows up in the connection's total_changes.
+
+    With bitmaps.ENABLED, the registry also mirrors each habit's completion bitmap, and
+    the completion checks and rates are answered from it with bit operations.
+
+    Every call uses the calling thread's pooled connection, so use one repository per
+    thread; get_repository() returns it.
+    """
+
+    def __init__(self, db_name=None, preload=False):
+        """
+        Args:
+            db_name (str, optional): Path of the database file. Defaults to db.DB_NAME.
+            preload (bool): Load every habit on the first lookup after an invalidation,
+                instead of one habit per lookup. Pays off in long-running sessions.
+        """
+        self.db_name = db_name
+        self.preload = preload
+        self._habits = {}
+        self._complete = False
+        self._bitmaps = {}
+        self._conn = None
+        self._data_version = None
+        self._changes = None
+
+    def _connection(self):
+        """
+        Returns the pooled connection, first emptying the registry if the database may have
+        changed since it was filled.
+        """
+        conn = get_connection(self.db_name)
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        # data_version numbers are only comparable on one connection
+        if conn is not self._conn or data_version != self._data_version or conn.total_changes != self._changes:
+            self.invalidate()
+            self._conn, self._data_version, self._changes = conn, data_version, conn.total_changes
+        return conn
+
+    def _written(self, conn):
+        """Accepts the changes of a write-through as already reflected in the registry."""
+        self._changes = conn.total_changes
+
+    def invalidate(self):
+        """Empties the registry, so the next lookups read the database again."""
+        self._habits = {}
+        self._complete = False
+        self._bitmaps = {}
+
+    def load(self):
+        """Reads every habit into the registry."""
+        conn = self._connection()
+        from_row = Habit.from_row
+        self._habits = {row[0]: from_row(row) for row in conn.execute(f"SELECT {HABIT_COLUMNS} FROM habits")}
+        self._complete = True
+
+    def get(self, name):
+        """
+        Looks up a habit by name.
+
+        Args:
+            name (str): The name of the habit.
+
+        Returns:
+            Habit or None: The habit with its stored periodicity and streak, or None if it
+                does not exist.
+        """
+        conn = self._connection()
+        if name in self._habits:
+            return self._habits[name]
+        if self._complete:
+            return None
+        if self.preload:
+            self.load()
+            return self._habits.get(name)
+        row = conn.execute(f"SELECT {HABIT_COLUMNS} FROM habits WHERE name = ?", (name,)).fetchone()
+        # Unknown names are remembered too, so repeated misses stay in memory
+        habit = self._habits[name] = Habit.from_row(row) if row else None
+        return habit
+
+    def exists(self, name):
+        """Checks if a habit with this name exists."""
+        return self.get(name) is not None
+
+    def all(self):
+        """
+        Returns every habit.
+
+        Returns:
+            list of Habit: The habits in the registry, loading them first if needed.
+        """
+        self._connection()
+        if not self._complete:
+            self.load()
+        return list(self._habits.values())
+
+    def completion_bitmap(self, name):
+        """
+        Returns a habit's completion bitmap from memory, loading it the first time. A
+        bitmap rebuilt from the completions is only kept in memory; complete_task stores
+        one rebuilt under its write lock.
+
+        Args:
+            name (str): The name of the habit.
+
+        Returns:
+            bitmaps.CompletionBitmap or None: The bitmap, or None if the habit does not exist.
+        """
+        conn = self._connection()
+        entry = self._bitmaps.get(name)
+        if entry is None:
+            row = conn.execute("SELECT id FROM habits WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                return None
+            entry = self._bitmaps[name] = (row[0], bitmaps.load(conn, row[0]))
+        return entry[1]
+
+    def is_completed_today(self, habit):
+        """Checks if a habit was completed today, with one bit test when bitmaps are enabled."""
+        if not bitmaps.ENABLED:
+            return habit.is_completed_today()
+        bitmap = self.completion_bitmap(habit.name)
+        return bitmap is not None and bitmap.has(datetime.now().date().toordinal())
+
+    def is_completed_within_7_days(self, habit):
+        """Checks if a habit was completed in the last 7 days, from the bitmap's highest bit when enabled."""
+        if not bitmaps.ENABLED:
+            return habit.is_completed_within_7_days()
+        bitmap = self.completion_bitmap(habit.name)
+        last_day = bitmap.last_day if bitmap is not None else None
+        return last_day is not None and datetime.now().date().toordinal() - last_day < 7
+
+    def completion_rate(self, name, days):
+        """
+        Returns the share of the last days, up to and including today, on which a habit was
+        completed; a popcount over the bitmap when bitmaps are enabled.
+
+        Args:
+            name (str): The name of the habit.
+            days (int): The length of the window in days.
+
+        Returns:
+            float or None: The rate between 0 and 1, or None if the habit does not exist.
+        """
+        if not bitmaps.ENABLED:
+            from analytics import completion_rate
+            return completion_rate(name, days)
+        bitmap = self.completion_bitmap(name)
+        return bitmap.completion_rate(days, datetime.now().date().toordinal()) if bitmap is not None else None
+
+    def save(self, habit):
+        """
+        Saves a new habit to the database and the registry.
+
+        Args:
+            habit (Habit): The habit to save.
+
+        Returns:
+            bool: True if the habit was added, False if one with its name already exists.
+        """
+        if self.exists(habit.name):
+            return False
+        habit.save()
+        self._habits[habit.name] = habit
+        self._written(self._conn)
+        return True
+
+    def delete(self, name):
+        """
+        Deletes a habit and its completions from the database and the registry.
+
+        Args:
+            name (str): The name of the habit.
+
+        Returns:
+            bool: True if the habit was deleted, False if it does not exist.
+        """
+        habit = self.get(name)
+        if habit is None:
+            return False
+        habit.delete()
+        self._habits[name] = None
+        self._written(self._conn)
+        return True
+
+    def complete_task(self, habit, date=None):
+        """
+        Marks a habit from the registry as completed, keeping its cached streak current.
+
+        Args:
+            habit (Habit): A habit returned by get().
+            date (datetime, optional): The date of completion. Defaults to today.
+
+        Returns:
+            bool: True if a completion was recorded, see Habit.complete_task.
+        """
+        conn = self._connection()
+        completed = habit.complete_task(date)
+        if completed:
+            # complete_task refreshes the habit's streak, so it is current even if the
+            # registry was refilled since the habit was looked up
+            self._habits[habit.name] = habit
+            entry = self._bitmaps.get(habit.name)
+            if entry is not None:
+                # The insert trigger dropped the stored bitmap. Another writer may have added
+                # completions the mirror lacks, so rebuild it under the write lock before
+                # storing it, keeping every stored bitmap current.
+                habit_id = entry[0]
+                with conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    bitmap = bitmaps.load(conn, habit_id)
+                    bitmaps.store(conn, habit_id, bitmap)
+                self._bitmaps[habit.name] = (habit_id, bitmap)
+        self._written(conn)
+        return completed
+
+def get_repository():
+    """
+    Returns the calling thread's habit repository, creating it on first use.
+
+    Returns:
+        HabitRepository: The repository for the current thread's pooled connection.
+    """
+    repository = getattr(_local, "repository", None)
+    if repository is None:
+        repository = _local.repository = HabitRepository()
+    return repository
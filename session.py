@@ -0,0 +1,134 @@
+# File: session.py
+
+import shlex
+from datetime import date
+
+import click
+
+from db import get_connection
+from habit_tracker import Habit, setup_database
+from repository import get_repository
+
+# Commands that start a session of their own and cannot run inside one
+SESSION_COMMANDS = {'serve', 'shell'}
+
+class CommandSession:
+    """
+    Runs CLI commands in-process against one set-up database, for the daemon and the shell.
+
+    Commands skip the per-process setup the CLI group callback does. Streaks are refreshed
+    before a command only when they can have changed behind the session's back: on the
+    first command of a day, when a streak may have lapsed, and when another connection has
+    written to the database, which SQLite reports through PRAGMA data_version. Habit
+    lookups are served by the thread's HabitRepository, which the session fills with every
+    habit at once.
+    """
+
+    def __init__(self, group):
+        """
+        Args:
+            group (click.Group): The CLI command group to run commands with.
+        """
+        setup_database()
+        get_repository().preload = True
+        self.group = group
+        self.refreshed_on = None
+        self.data_version = None
+
+    def refresh(self):
+        """Recomputes stale and lapsed streaks if the day changed or another writer committed."""
+        today = date.today()
+        data_version = get_connection().execute("PRAGMA data_version").fetchone()[0]
+        if today != self.refreshed_on or data_version != self.data_version:
+            Habit.update_all_streaks()
+            self.refreshed_on = today
+            self.data_version = data_version
+
+    def invoke(self, args):
+        """
+        Runs one command, printing its output and errors like the CLI would.
+
+        Args:
+            args (list): The command line after 'cli.py', e.g. ['complete', 'Exercise'].
+
+        Returns:
+            int: The exit code of the command.
+        """
+        if args and args[0] in SESSION_COMMANDS:
+            click.echo(f"'{args[0]}' cannot be run inside a session.", err=True)
+            return 2
+        try:
+            self.refresh()
+            exit_code = self.group.main(args=list(args), prog_name="cli.py", standalone_mode=False,
+                                        obj={'warm': True})
+            return exit_code if isinstance(exit_code, int) else 0
+        except click.ClickException as error:
+            error.show()
+            return error.exit_code
+        except click.Abort:
+            click.echo("Aborted!", err=True)
+            return 1
+        except Exception as error:
+            # A failing command must not end the session
+            click.echo(f"Error: {error}", err=True)
+            return 1
+
+def run_script(session, lines):
+    """
+    Runs a script of commands, one per line. Blank lines and lines starting with '#' are
+    skipped; a failing command is reported with its line number and the script goes on.
+
+    Args:
+        session (CommandSession): The session to run the commands in.
+        lines (iterable): The lines of the script.
+
+    Returns:
+        int: 0 if every command succeeded, 1 otherwise.
+    """
+    failed = False
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            args = shlex.split(line)
+        except ValueError as error:
+            click.echo(f"Line {number}: {error}", err=True)
+            failed = True
+            continue
+        if session.invoke(args) != 0:
+            click.echo(f"Line {number}: '{line}' failed.", err=True)
+            failed = True
+    return 1 if failed else 0
+
+def run_interactive(session):
+    """
+    Reads commands from the terminal until 'exit', 'quit' or end of input.
+
+    Args:
+        session (CommandSession): The session to run the commands in.
+    """
+    try:
+        # Importing readline enables line editing and history where it is available
+        import readline
+    except ImportError:
+        pass
+
+    click.echo("Habit Tracker shell. Type 'help' for the commands, 'exit' to leave.")
+    while True:
+        try:
+            line = input("habits> ").strip()
+        except (EOFError, KeyboardInterrupt):
+            click.echo()
+            break
+        if line in ('exit', 'quit'):
+            break
+        if line == 'help':
+            line = '--help'
+        try:
+            args = shlex.split(line)
+        except ValueError as error:
+            click.echo(f"Error: {error}", err=True)
+            continue
+        if args:
+            session.invoke(args)
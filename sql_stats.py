@@ -0,0 +1,177 @@
+# File: sql_stats.py
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# Set HABIT_SQL_STATS=0 to open plain connections without the timing hooks
+ENABLED = os.environ.get("HABIT_SQL_STATS", "1") != "0"
+
+# Statements whose execution and fetching take at least this long are written to SLOW_QUERY_LOG
+SLOW_QUERY_MS = float(os.environ.get("HABIT_SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG = os.environ.get("HABIT_SLOW_QUERY_LOG", "slow_queries.log")
+
+# Callables invoked as listener(sql, params_shape, seconds, rows) after every finished statement
+LISTENERS = []
+
+_stats = {}
+_lock = threading.Lock()
+
+def _normalize(sql):
+    """Collapses the whitespace of a statement, so one statement always maps to one key."""
+    return " ".join(sql.split())
+
+def _params_shape(params, many=False):
+    """
+    Describes the parameters of a statement without their values, e.g. 'tuple[2]',
+    'dict[name,today]' or 'many[500]'.
+    """
+    if many:
+        return f"many[{len(params) if hasattr(params, '__len__') else '?'}]"
+    if isinstance(params, dict):
+        return f"dict[{','.join(sorted(params))}]"
+    return f"{type(params).__name__}[{len(params)}]"
+
+def record(sql, params_shape, seconds, rows):
+    """
+    Adds one finished statement to the aggregated counters and, if it was slow, to the
+    slow-query log.
+
+    Args:
+        sql (str): The statement text.
+        params_shape (str): The shape of its parameters, see _params_shape.
+        seconds (float): Time spent executing the statement and fetching its rows.
+        rows (int): Rows returned, or rows changed for statements that return none.
+    """
+    key = _normalize(sql)
+    with _lock:
+        entry = _stats.get(key)
+        if entry is None:
+            entry = _stats[key] = {"calls": 0, "total_s": 0.0, "max_s": 0.0, "rows": 0, "params": params_shape}
+        entry["calls"] += 1
+        entry["total_s"] += seconds
+        entry["max_s"] = max(entry["max_s"], seconds)
+        entry["rows"] += rows
+    for listener in LISTENERS:
+        listener(key, params_shape, seconds, rows)
+
+    if SLOW_QUERY_LOG and seconds * 1000 >= SLOW_QUERY_MS:
+        line = f"{datetime.now().isoformat(timespec='seconds')} {seconds * 1000:.1f} ms rows={rows} params={params_shape} {key}\n"
+        try:
+            with open(SLOW_QUERY_LOG, "a") as log:
+                log.write(line)
+        except OSError:
+            # The log is a diagnostic aid and must never break the statement that triggered it
+            pass
+
+def snapshot():
+    """
+    Returns the aggregated counters of this process, slowest statements first.
+
+    Returns:
+        list of dict: One entry per statement with 'sql', 'calls', 'total_s', 'mean_s',
+            'max_s', 'rows' and 'params' (the parameter shape of its first call).
+    """
+    with _lock:
+        entries = [dict(entry, sql=sql) for sql, entry in _stats.items()]
+    for entry in entries:
+        entry["mean_s"] = entry["total_s"] / entry["calls"]
+    return sorted(entries, key=lambda entry: entry["total_s"], reverse=True)
+
+def reset():
+    """Clears the aggregated counters."""
+    with _lock:
+        _stats.clear()
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    A cursor that times every statement it runs. SQLite produces rows lazily, so the time
+    spent fetching counts towards the statement; it is recorded once its rows are
+    exhausted, when the cursor runs its next statement, or when the cursor goes away.
+    """
+
+    _pending = None
+
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            record(*pending)
+
+    def _timed(self, method, sql, params, shape):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            return method(sql, params)
+        finally:
+            seconds = time.perf_counter() - start
+            self._pending = [sql, shape, seconds, 0]
+            if self.description is None:
+                # Nothing to fetch: the statement is done, count the rows it changed
+                self._pending[3] = max(self.rowcount, 0)
+                self._finish()
+
+    def _fetched(self, method, *args):
+        start = time.perf_counter()
+        rows = method(*args)
+        if self._pending is not None:
+            self._pending[2] += time.perf_counter() - start
+            self._pending[3] += len(rows) if isinstance(rows, list) else rows is not None
+        return rows
+
+    def execute(self, sql, params=()):
+        return self._timed(super().execute, sql, params, _params_shape(params))
+
+    def executemany(self, sql, params):
+        if not hasattr(params, "__len__"):
+            params = list(params)
+        return self._timed(super().executemany, sql, params, _params_shape(params, many=True))
+
+    def fetchone(self):
+        row = self._fetched(super().fetchone)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._fetched(super().fetchmany, self.arraysize if size is None else size)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._fetched(super().fetchall)
+        self._finish()
+        return rows
+
+    def __iter__(self):
+        # Fetching in batches keeps iteration over large results close to native speed
+        while True:
+            rows = self.fetchmany(1000)
+            if not rows:
+                return
+            yield from rows
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            # Cursors collected at interpreter shutdown may outlive the modules record() needs
+            pass
+
+class InstrumentedConnection(sqlite3.Connection):
+    """A connection whose cursors, including the ones behind execute(), are InstrumentedCursors."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, params):
+        return self.cursor().executemany(sql, params)
@@ -0,0 +1,116 @@
+# File: streaks_numpy.py
+
+from datetime import datetime
+
+import numpy as np
+
+from streaks_sql import STALE_HABITS_CONDITION
+
+def compute_runs(habit_ids, weekly, days):
+    """
+    Computes the latest and the longest run of every habit from unsorted completions,
+    using one sort and vectorized diff/cumsum passes instead of a per-habit loop.
+
+    Args:
+        habit_ids (numpy.ndarray): Integer habit key of each completion.
+        weekly (numpy.ndarray): 1 where the completion's habit is weekly, 0 for daily.
+        days (numpy.ndarray): Day ordinal of each completion.
+
+    Returns:
+        dict: Arrays aligned per habit: 'habit_id', 'weekly', 'run_start', 'run_end',
+            'end_period', 'run_length' (of the latest run) and 'best_streak'.
+    """
+    periods = np.where(weekly == 1, (days - 1) // 7, days)
+    order = np.lexsort((days, habit_ids))
+    habit_ids, weekly, days, periods = habit_ids[order], weekly[order], days[order], periods[order]
+
+    new_habit = np.ones(len(days), dtype=bool)
+    new_habit[1:] = habit_ids[1:] != habit_ids[:-1]
+    step = np.zeros(len(days), dtype=np.int64)
+    step[1:] = np.diff(periods)
+
+    # A run starts at a habit's first completion or after a skipped period; several
+    # completions within the same period count once towards the run length
+    run_breaks = new_habit | (step > 1)
+    counted = new_habit | (step != 0)
+    run_ids = np.cumsum(run_breaks) - 1
+    run_lengths = np.bincount(run_ids, weights=counted).astype(np.int64)
+
+    run_first = np.flatnonzero(run_breaks)
+    run_last = np.append(run_first[1:] - 1, len(days) - 1)
+    run_habits = habit_ids[run_first]
+
+    habit_first_run = np.ones(len(run_first), dtype=bool)
+    habit_first_run[1:] = run_habits[1:] != run_habits[:-1]
+    habit_starts = np.flatnonzero(habit_first_run)
+    latest = np.append(habit_starts[1:] - 1, len(run_first) - 1)
+
+    return {
+        "habit_id": run_habits[latest],
+        "weekly": weekly[run_first[latest]],
+        "run_start": days[run_first[latest]],
+        "run_end": days[run_last[latest]],
+        "end_period": periods[run_last[latest]],
+        "run_length": run_lengths[latest],
+        "best_streak": np.maximum.reduceat(run_lengths, habit_starts),
+    }
+
+def update_all_streaks(conn, full=False):
+    """
+    Recomputes the streak state of every stale habit by loading their completions as
+    integer day numbers into NumPy arrays. Meant for bulk recomputes over millions of
+    completion rows, where it produces the same state as Habit.update_streak.
+
+    Args:
+        conn (sqlite3.Connection): The connection to read from and write to.
+        full (bool): Recompute every habit, not only the stale ones.
+
+    Returns:
+        int: The number of habits updated.
+    """
+    today = datetime.now().date()
+    params = {"full": int(full), "today_iso": today.isoformat()}
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT id FROM habits WHERE {STALE_HABITS_CONDITION}", params)
+    targets = [row[0] for row in cursor.fetchall()]
+    if not targets:
+        return 0
+
+    # CROSS JOIN keeps habits as the outer loop, so only the stale habits' completions are
+    # read through the primary key instead of scanning every completion
+    cursor.execute(f"""
+        SELECT c.habit_id, h.periodicity = 'weekly', c.day
+        FROM habits h
+        CROSS JOIN completion_days c ON c.habit_id = h.id
+        WHERE {STALE_HABITS_CONDITION}
+    """, params)
+    rows = np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 3)
+
+    updates = []
+    if len(rows):
+        runs = compute_runs(rows[:, 0], rows[:, 1], rows[:, 2])
+        today_periods = np.where(runs["weekly"] == 1, (today.toordinal() - 1) // 7, today.toordinal())
+        streaks = np.where(today_periods - runs["end_period"] > 1, 0, runs["run_length"])
+        updates = list(zip(
+            streaks.tolist(),
+            runs["run_start"].tolist(),
+            runs["run_end"].tolist(),
+            runs["run_length"].tolist(),
+            runs["best_streak"].tolist(),
+            runs["habit_id"].tolist(),
+        ))
+
+    # Stale habits without any completion fall back to the empty state
+    with_completions = {update[-1] for update in updates}
+    updates.extend((0, None, None, 0, 0, habit_id) for habit_id in targets if habit_id not in with_completions)
+
+    with conn:
+        conn.executemany(
+            """
+            UPDATE habits
+            SET streak = ?, run_start = ?, run_end = ?, run_length = ?, best_streak = ?, streak_as_of = ?
+            WHERE id = ?
+            """,
+            [update[:5] + (today.isoformat(),) + update[5:] for update in updates]
+        )
+    return len(updates)
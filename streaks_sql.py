@@ -0,0 +1,95 @@
+# File: streaks_sql.py
+
+from datetime import datetime
+
+# Habits a bulk recompute has to visit: all of them when :full is set, otherwise those
+# whose completions changed and those whose ongoing streak may have lapsed since
+STALE_HABITS_CONDITION = ":full OR streak_as_of IS NULL OR (streak > 0 AND streak_as_of < :today_iso)"
+
+# Gaps and islands: within a habit, consecutive periods minus their row number give a
+# constant, so grouping by that difference yields one row per run. Weekly habits are
+# bucketed into Monday-based weeks first (ordinal 1 is a Monday). The latest run of
+# each habit becomes its stored state and the longest one its best streak.
+UPDATE_STREAKS_SQL = f"""
+    WITH targets AS (
+        SELECT id, periodicity
+        FROM habits
+        WHERE {STALE_HABITS_CONDITION}
+    ),
+    periods AS (
+        SELECT t.id AS habit_id,
+               CASE WHEN t.periodicity = 'weekly' THEN (c.day - 1) / 7 ELSE c.day END AS period,
+               MIN(c.day) AS first_day,
+               MAX(c.day) AS last_day
+        FROM targets t
+        JOIN completion_days c ON c.habit_id = t.id
+        GROUP BY t.id, period
+    ),
+    islands AS (
+        SELECT habit_id, period, first_day, last_day,
+               period - ROW_NUMBER() OVER (PARTITION BY habit_id ORDER BY period) AS island
+        FROM periods
+    ),
+    runs AS (
+        SELECT habit_id,
+               MIN(first_day) AS run_start,
+               MAX(last_day) AS run_end,
+               MAX(period) AS end_period,
+               COUNT(*) AS run_length
+        FROM islands
+        GROUP BY habit_id, island
+    ),
+    ranked AS (
+        SELECT runs.*,
+               ROW_NUMBER() OVER (PARTITION BY habit_id ORDER BY end_period DESC) AS recency,
+               MAX(run_length) OVER (PARTITION BY habit_id) AS best_streak
+        FROM runs
+    ),
+    latest AS (
+        SELECT habit_id AS id, run_start, run_end, end_period, run_length, best_streak
+        FROM ranked
+        WHERE recency = 1
+        UNION ALL
+        SELECT t.id, NULL, NULL, NULL, 0, 0
+        FROM targets t
+        WHERE NOT EXISTS (SELECT 1 FROM completion_days c WHERE c.habit_id = t.id)
+    )
+    UPDATE habits
+    SET run_start = latest.run_start,
+        run_end = latest.run_end,
+        run_length = latest.run_length,
+        best_streak = latest.best_streak,
+        streak = CASE
+            WHEN latest.end_period IS NULL THEN 0
+            WHEN (CASE WHEN habits.periodicity = 'weekly' THEN (:today - 1) / 7 ELSE :today END)
+                 - latest.end_period > 1 THEN 0
+            ELSE latest.run_length
+        END,
+        streak_as_of = :today_iso
+    FROM latest
+    WHERE latest.id = habits.id
+"""
+
+def update_all_streaks(conn, full=False):
+    """
+    Recomputes the streak state of every stale habit with a single set-based statement,
+    instead of reading and folding each habit's completions in Python.
+
+    Produces the same run_start, run_end, run_length, best_streak and streak values as
+    Habit.update_streak.
+
+    Args:
+        conn (sqlite3.Connection): The connection to run the update on.
+        full (bool): Recompute every habit, not only the stale ones.
+
+    Returns:
+        int: The number of habits updated.
+    """
+    today = datetime.now().date()
+    with conn:
+        conn.execute(
+            UPDATE_STREAKS_SQL,
+            {"full": int(full), "today": today.toordinal(), "today_iso": today.isoformat()}
+        )
+        # cursor.rowcount is -1 for statements that start with WITH, so ask SQLite directly
+        return conn.execute("SELECT changes()").fetchone()[0]
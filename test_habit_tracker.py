@@ -2,7 +2,13 @@
 
 import pytest
 from datetime import datetime, timedelta
+import json
+import socket
 import sqlite3
+import threading
+import daemon
+import migrations
+from db import close_connection, get_connection
 from habit_tracker import Habit, setup_database
 from analytics import (
     get_all_habits,
@@ -29,6 +35,18 @@ def setup_and_teardown():
         cursor.execute("DELETE FROM completions")
         conn.commit()
 
+@pytest.fixture
+def sql_hooks(monkeypatch):
+    """
+    Fixture to turn on the sql_stats hooks, whatever HABIT_SQL_STATS is set to, for tests that
+    count or explain statements. The pooled connection is reopened so it is instrumented.
+    """
+    import sql_stats
+    close_connection()
+    monkeypatch.setattr(sql_stats, "ENABLED", True)
+    yield
+    close_connection()
+
 def test_create_habit():
     """Test if a habit can be created and stored in the database."""
     habit = Habit("Exercise", "daily")
@@ -170,8 +188,9 @@ def test_daily_streak_breaks_on_skip():
     habit.complete_task(date=now - timedelta(days=3))  # Skipping day 2
     habit.update_streak()
 
-    # Expect streak to be 1 as the consecutive completion is broken by the skip
-    assert habit.streak == 1
+    # Expect the current streak to count only today and yesterday, as the skip breaks the run
+    assert habit.streak == 2
+    assert habit.best_streak == 2
 
 def test_weekly_streak_breaks_on_skip():
     """Test that the streak for a weekly habit breaks if one week is missed."""
@@ -206,3 +225,723 @@ def test_weekly_habit_completion_within_7_days():
         completion_count = cursor.fetchone()[0]
     
     assert completion_count == 1  # Only one completion should exist
+
+def test_connection_is_reused_until_closed():
+    """Test that repeated calls share one pooled connection until it is explicitly closed."""
+    conn = get_connection()
+    assert get_connection() is conn
+
+    close_connection()
+    reopened = get_connection()
+    assert reopened is not conn
+
+    # The reopened connection is fully usable by the Habit methods
+    habit = Habit("Exercise", "daily")
+    habit.save()
+    assert habit.exists_in_db()
+
+def test_update_all_streaks_only_recomputes_stale_habits():
+    """Test that only habits whose completions changed are flagged and recomputed."""
+    habit1 = Habit("Exercise", "daily")
+    habit2 = Habit("Read a book", "weekly")
+    habit1.save()
+    habit2.save()
+
+    # Insert a completion behind the Habit API's back, as another process would
+    with sqlite3.connect(DB_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO completions (habit_name, date, time) VALUES (?, ?, ?)",
+                       ("Exercise", datetime.now().date().isoformat(), "08:00:00"))
+        conn.commit()
+        cursor.execute("SELECT name FROM habits WHERE streak_as_of IS NULL")
+        stale = [row[0] for row in cursor.fetchall()]
+
+    assert stale == ["Exercise"]
+
+    Habit.update_all_streaks()
+    assert longest_streak_for_habit("Exercise") == 1
+
+    with sqlite3.connect(DB_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM habits WHERE streak_as_of IS NULL")
+        assert cursor.fetchone()[0] == 0
+
+def test_streak_is_maintained_incrementally_on_append():
+    """Test that in-order completions extend the stored run state without a rebuild."""
+    habit = Habit("Exercise", "daily")
+    habit.save()
+    today = datetime.now()
+
+    # Two runs: four days ending a week ago, then the last two days
+    for days_ago in (10, 9, 8, 7, 1, 0):
+        habit.complete_task(date=today - timedelta(days=days_ago))
+
+    assert habit.streak == 2
+    assert habit.best_streak == 4
+
+    with sqlite3.connect(DB_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT run_start, run_end, run_length, best_streak FROM habits WHERE name = ?", (habit.name,))
+        state = cursor.fetchone()
+
+    yesterday = (today - timedelta(days=1)).date().toordinal()
+    assert state == (yesterday, today.date().toordinal(), 2, 4)
+
+    # A full rebuild from the history agrees with the incremental state
+    habit.update_streak()
+    assert (habit.streak, habit.best_streak) == (2, 4)
+
+def test_lapsed_streak_is_reset_by_update_all_streaks():
+    """Test that a streak whose last completion is too old is reported as 0."""
+    habit = Habit("Exercise", "daily")
+    habit.save()
+    now = datetime.now()
+
+    for days_ago in (5, 4, 3):
+        habit.complete_task(date=now - timedelta(days=days_ago))
+    assert habit.streak == 0
+    assert habit.best_streak == 3
+
+    # Pretend the streak was computed before the run lapsed
+    with sqlite3.connect(DB_NAME) as conn:
+        conn.execute("UPDATE habits SET streak = 3, streak_as_of = ? WHERE name = ?",
+                     ((now - timedelta(days=3)).date().isoformat(), habit.name))
+        conn.commit()
+
+    Habit.update_all_streaks()
+    with sqlite3.connect(DB_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT streak FROM habits WHERE name = ?", (habit.name,))
+        assert cursor.fetchone()[0] == 0
+
+def _insert_completions(name, days_ago):
+    """Inserts raw completion rows for a habit, bypassing the Habit API."""
+    today = datetime.now().date()
+    with sqlite3.connect(DB_NAME) as conn:
+        conn.executemany(
+            "INSERT INTO completions (habit_name, date, time) VALUES (?, ?, ?)",
+            [(name, (today - timedelta(days=n)).isoformat(), "08:00:00") for n in days_ago]
+        )
+        conn.commit()
+
+def _streak_state():
+    """Returns the stored streak state of every habit, keyed by name."""
+    with sqlite3.connect(DB_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name, streak, run_start, run_end, run_length, best_streak FROM habits")
+        return {row[0]: row[1:] for row in cursor.fetchall()}
+
+@pytest.mark.parametrize("engine", ["sql", "numpy", "bitmap"])
+def test_streak_engines_match_python_engine(engine):
+    """Test that alternative streak engines store exactly what the Python engine stores."""
+    if engine == "numpy":
+        pytest.importorskip("numpy")
+    histories = {
+        ("Exercise", "daily"): [0, 1, 2, 5, 6, 7, 8, 20],
+        ("Drink water", "daily"): [3, 4, 5],
+        ("Read a book", "weekly"): [0, 7, 8, 14, 35, 42],
+        ("Clean the house", "weekly"): [21, 28],
+        ("Practice coding", "daily"): [],
+    }
+    for (name, periodicity), days_ago in histories.items():
+        Habit(name, periodicity).save()
+        _insert_completions(name, days_ago)
+
+    Habit.update_all_streaks(engine="python", full=True)
+    expected = _streak_state()
+
+    with sqlite3.connect(DB_NAME) as conn:
+        conn.execute("UPDATE habits SET streak = NULL, run_start = NULL, run_end = NULL, "
+                     "run_length = NULL, best_streak = 0, streak_as_of = NULL")
+        conn.commit()
+
+    Habit.update_all_streaks(engine=engine)
+    assert _streak_state() == expected
+    assert expected["Exercise"][0] == 3
+    assert expected["Read a book"][4] == 3
+
+def test_setup_database_migrates_text_dated_completions(tmp_path, monkeypatch):
+    """Test that a database with the original text-dated completions table is migrated in place."""
+    import db
+    legacy_db = str(tmp_path / "legacy.db")
+    with sqlite3.connect(legacy_db) as conn:
+        conn.execute("CREATE TABLE habits (name TEXT PRIMARY KEY, periodicity TEXT, created_at TEXT, streak INTEGER)")
+        conn.execute("""
+            CREATE TABLE completions (
+                habit_name TEXT, date TEXT, time TEXT,
+                FOREIGN KEY (habit_name) REFERENCES habits (name),
+                PRIMARY KEY (habit_name, date)
+            )
+        """)
+        conn.execute("INSERT INTO habits VALUES ('Exercise', 'daily', '2024-01-01 08:00:00', 0)")
+        conn.executemany("INSERT INTO completions VALUES ('Exercise', ?, '08:00:00')",
+                         [("2024-02-28",), ("2024-02-29",), ("2024-03-01",)])
+        conn.commit()
+
+    monkeypatch.setattr(db, "DB_NAME", legacy_db)
+    try:
+        setup_database()
+        Habit.update_all_streaks()
+        with sqlite3.connect(legacy_db) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT day FROM completion_days ORDER BY day")
+            days = [row[0] for row in cursor.fetchall()]
+            cursor.execute("SELECT date FROM completions ORDER BY date")
+            dates = [row[0] for row in cursor.fetchall()]
+            cursor.execute("SELECT best_streak FROM habits WHERE name = 'Exercise'")
+            best_streak = cursor.fetchone()[0]
+    finally:
+        db.close_connection(legacy_db)
+
+    first_day = datetime(2024, 2, 28).toordinal()
+    assert days == [first_day, first_day + 1, first_day + 2]
+    assert dates == ["2024-02-28", "2024-02-29", "2024-03-01"]
+    assert best_streak == 3
+
+def test_migrations_record_version_and_roll_back_failed_steps(tmp_path, monkeypatch):
+    """Test that migrations bump user_version, are skipped once applied, and are transactional."""
+    conn = sqlite3.connect(str(tmp_path / "fresh.db"))
+    applied = migrations.migrate(conn)
+    assert applied == [version for version, _, _ in migrations.MIGRATIONS]
+    assert migrations.current_version(conn) == migrations.latest_version()
+    assert migrations.migrate(conn) == []
+    version = migrations.current_version(conn)
+
+    def broken_step(cursor):
+        cursor.execute("CREATE TABLE half_done (id INTEGER)")
+        raise RuntimeError("step failed")
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS + [(10**6, "Broken", broken_step)])
+    with pytest.raises(RuntimeError):
+        migrations.migrate(conn)
+
+    cursor = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'half_done'")
+    assert cursor.fetchone() is None
+    assert migrations.current_version(conn) == version
+    conn.close()
+
+def test_deleted_habit_does_not_leave_completions_behind():
+    """Test that completions are keyed by habit id and removed together with their habit."""
+    habit = Habit("Exercise", "daily")
+    habit.save()
+    habit.complete_task()
+    habit.delete()
+
+    # Re-adding a habit with the same name starts with a clean history
+    habit = Habit("Exercise", "daily")
+    habit.save()
+    assert habit.is_completed_today() == False
+
+    with sqlite3.connect(DB_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM completion_days")
+        assert cursor.fetchone()[0] == 0
+
+def test_concurrent_writers_do_not_hit_locked_database():
+    """Test that threads with their own pooled connections can complete habits concurrently."""
+    names = [f"Habit {i}" for i in range(8)]
+    for name in names:
+        Habit(name, "daily").save()
+
+    assert get_connection().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    errors = []
+    def worker(name):
+        try:
+            habit = Habit(name, "daily")
+            for days_ago in range(20, -1, -1):
+                habit.complete_task(date=datetime.now() - timedelta(days=days_ago))
+        except sqlite3.OperationalError as error:
+            errors.append(error)
+        finally:
+            close_connection()
+
+    threads = [threading.Thread(target=worker, args=(name,)) for name in names]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert all(streak == 21 for _, _, _, streak in get_all_habits())
+
+def test_complete_many_applies_periodicity_rules_and_updates_streaks():
+    """Test that a batch of completions is validated, inserted, and reflected in the streaks."""
+    Habit("Exercise", "daily").save()
+    Habit("Read a book", "weekly").save()
+    today = datetime.now()
+
+    records = [("Exercise", today - timedelta(days=i)) for i in range(5)]
+    records.append(("Exercise", today))                                  # Same day twice
+    records.append(("Read a book", (today - timedelta(days=14)).date().isoformat()))
+    records.append(("Read a book", (today - timedelta(days=10)).date().isoformat()))  # Too close
+    records.append(("Read a book", (today - timedelta(days=7)).date().isoformat()))
+    records.append(("Read a book", None))                                # Today
+    records.append(("Unknown habit", today))
+
+    result = Habit.complete_many(records)
+
+    assert result == {"completed": 8, "skipped": 3, "unknown": ["Unknown habit"], "invalid": []}
+    streaks = {name: streak for name, _, _, streak in get_all_habits()}
+    assert streaks == {"Exercise": 5, "Read a book": 3}
+
+def test_complete_batch_skips_malformed_records_and_reports_their_lines(tmp_path):
+    """Test that complete-batch completes the valid records and reports malformed ones by line."""
+    from click.testing import CliRunner
+    from cli import cli
+    Habit("Exercise", "daily").save()
+    yesterday = (datetime.now() - timedelta(days=1)).date().isoformat()
+    source = tmp_path / "completions.csv"
+    source.write_text(f"name,date,time\nExercise,{yesterday},\nExercise,2020-13-01,\n"
+                      f",{yesterday},\nExercise,,25:00\nExercise,,\n")
+
+    result = CliRunner().invoke(cli, ["complete-batch", str(source)])
+    assert result.exit_code == 0
+    assert result.output.splitlines() == [
+        "Completed 2 of 5 records, skipped 3.",
+        "Line 3: invalid date '2020-13-01': month must be in 1..12.",
+        "Line 4: missing habit name.",
+        "Line 5: invalid time '25:00'.",
+    ]
+    assert longest_streak_for_habit("Exercise") == 2
+
+    source.write_text(f"habit,date\nExercise,{yesterday}\n")
+    result = CliRunner().invoke(cli, ["complete-batch", str(source)])
+    assert result.exit_code == 2
+    assert "line 1: the CSV header has no 'name' column." in result.output
+
+    source.write_text(f'{{"name": "Exercise", "date": "{yesterday}"}}\n[1, 2]\n{{"name": \n')
+    result = CliRunner().invoke(cli, ["complete-batch", "--format", "jsonl", str(source)])
+    assert result.output.splitlines() == [
+        "Completed 0 of 3 records, skipped 3.",
+        "Line 2: not a JSON object.",
+        "Line 3: not a JSON object.",
+    ]
+
+def test_get_incomplete_habits_for_today():
+    """Test that the to-do list applies the daily and the weekly completion windows."""
+    for name, periodicity in [("Exercise", "daily"), ("Drink water", "daily"),
+                              ("Read a book", "weekly"), ("Clean the house", "weekly")]:
+        Habit(name, periodicity).save()
+    today = datetime.now()
+
+    Habit("Exercise", "daily").complete_task()
+    Habit("Drink water", "daily").complete_task(date=today - timedelta(days=1))
+    Habit("Read a book", "weekly").complete_task(date=today - timedelta(days=3))
+    _insert_completions("Clean the house", [8])
+
+    incomplete = [habit[0] for habit in get_incomplete_habits_for_today()]
+    assert incomplete == ["Drink water", "Clean the house"]
+
+def test_completion_summary_follows_inserts_and_deletes():
+    """Test that the last completion day and completion count stay in step with the completions."""
+    habit = Habit("Exercise", "daily")
+    habit.save()
+    today = datetime.now().date()
+    habit.complete_task(date=datetime.now() - timedelta(days=2))
+    _insert_completions("Exercise", [5, 0])
+
+    with sqlite3.connect(DB_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT last_completed_day, completion_count FROM habits WHERE name = ?", (habit.name,))
+        assert cursor.fetchone() == (today.toordinal(), 3)
+        assert habit.is_completed_today() == True
+
+        # Removing the latest completion falls back to the previous one
+        conn.execute("DELETE FROM completions WHERE habit_name = ? AND date = ?", (habit.name, today.isoformat()))
+        conn.commit()
+        cursor.execute("SELECT last_completed_day, completion_count FROM habits WHERE name = ?", (habit.name,))
+        assert cursor.fetchone() == ((today - timedelta(days=2)).toordinal(), 2)
+    assert habit.is_completed_today() == False
+    assert habit.is_completed_within_7_days() == True
+
+def test_longest_streak_reports_best_run_not_current_streak():
+    """Test that the longest-streak analytics use the best run even after the streak broke."""
+    habit = Habit("Exercise", "daily")
+    habit.save()
+    _insert_completions("Exercise", [9, 8, 7, 6, 1, 0])
+    Habit.update_all_streaks()
+
+    assert _streak_state()["Exercise"][0] == 2
+    assert longest_streak_for_habit("Exercise") == 4
+    assert longest_streak_all_habits() == 4
+
+    with sqlite3.connect(DB_NAME) as conn:
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT MAX(best_streak) FROM habits").fetchall()
+    assert "idx_habits_best_streak" in plan[0][-1]
+
+def test_habits_inserted_without_a_best_streak_report_zero(tmp_path):
+    """Test that habits added outside Habit.save report a best streak of 0, also after upgrading."""
+    with sqlite3.connect(DB_NAME) as conn:
+        conn.execute("INSERT INTO habits (name, periodicity, created_at, streak) VALUES ('Exercise', 'daily', '', 0)")
+    assert longest_streak_for_habit("Exercise") == 0
+    assert longest_streak_all_habits() == 0
+
+    conn = sqlite3.connect(str(tmp_path / "version8.db"))
+    migrations.migrate(conn, target=8)
+    conn.execute("INSERT INTO habits (name, periodicity) VALUES ('Exercise', 'daily')")
+    conn.commit()
+    migrations.migrate(conn)
+    assert conn.execute("SELECT best_streak FROM habits").fetchall() == [(0,)]
+    plan = conn.execute("EXPLAIN QUERY PLAN SELECT MAX(best_streak) FROM habits").fetchall()
+    assert "idx_habits_best_streak" in plan[0][-1]
+    conn.close()
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="needs Unix domain sockets")
+def test_daemon_runs_commands_and_sees_other_writers(tmp_path, capsys):
+    """Test that the daemon runs CLI commands and refreshes streaks after writes from elsewhere."""
+    from cli import cli
+    socket_path = str(tmp_path / "habits.sock")
+    server = daemon.HabitServer(socket_path, cli)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        response = daemon.request(["add", "Exercise", "daily"], socket_path=socket_path)
+        assert response == {"stdout": "Habit 'Exercise' added with a periodicity of 'daily'.\n",
+                            "stderr": "", "exit_code": 0}
+        response = daemon.request(["complete", "Exercise"], socket_path=socket_path)
+        assert response["stdout"] == "Habit 'Exercise' marked as completed for today.\n"
+        assert daemon.request(["add", "Reading", "monthly"], socket_path=socket_path)["exit_code"] == 2
+
+        _insert_completions("Exercise", [1])
+        response = daemon.request(["list-all"], socket_path=socket_path)
+        assert response["stdout"].endswith("Streak: 2\n")
+
+        # Malformed requests are answered instead of leaving the client waiting
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(socket_path)
+            client.sendall(b'{"args": ["list-all"\n{"args": "list-all"}\n')
+            client.shutdown(socket.SHUT_WR)
+            with client.makefile("rb") as replies:
+                responses = [json.loads(line) for line in replies]
+        assert responses == [{"stdout": "", "stderr": "invalid request\n", "exit_code": 2}] * 2
+
+        # The client reaches a daemon on a non-default socket through the same --socket option
+        import client
+        capsys.readouterr()
+        assert client.main(["--socket", socket_path, "streak-for-habit", "Exercise"]) == 0
+        assert capsys.readouterr().out == "The longest streak for 'Exercise' is: 2\n"
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+def test_commands_that_display_streaks_refresh_them_first(monkeypatch):
+    """Test that read commands showing streaks recompute stale ones and drop lapsed ones."""
+    from click.testing import CliRunner
+    import habit_tracker
+    from cli import cli
+    monkeypatch.setattr(habit_tracker, "STREAK_ENGINE", "python")
+    for name in ("Exercise", "Stretching"):
+        Habit(name, "daily").save()
+    # A run computed before an upgrade: the migration left it stale and unrecomputed
+    _insert_completions("Exercise", [0, 1, 2, 3, 4])
+    # A run that ended 5 days ago, last stamped while it was still ongoing
+    _insert_completions("Stretching", [5, 6, 7])
+    Habit.update_all_streaks()
+    yesterday = (datetime.now() - timedelta(days=1)).date().isoformat()
+    with sqlite3.connect(DB_NAME) as conn:
+        conn.execute("UPDATE habits SET streak = 0, streak_as_of = NULL WHERE name = 'Exercise'")
+        conn.execute("UPDATE habits SET streak = 3, streak_as_of = ? WHERE name = 'Stretching'", (yesterday,))
+
+    lines = CliRunner().invoke(cli, ["list-all"]).output.splitlines()
+    assert [line.split(", ")[-1] for line in lines] == ["Streak: 5", "Streak: 0"]
+    assert CliRunner().invoke(cli, ["longest-streak"]).output == "The longest streak across all habits is: 5\n"
+
+def test_shell_script_runs_commands_in_one_session(capsys):
+    """Test that a shell script runs every command, skipping comments and reporting failures."""
+    from cli import cli
+    from session import CommandSession, run_script
+    script = [
+        "# morning routine",
+        'add "Morning run" daily',
+        "",
+        'complete "Morning run"',
+        "add Reading monthly",
+        'streak-for-habit "Morning run"',
+    ]
+    assert run_script(CommandSession(cli), script) == 1
+
+    output = capsys.readouterr()
+    assert "Habit 'Morning run' marked as completed for today." in output.out
+    assert "The longest streak for 'Morning run' is: 1" in output.out
+    assert "Line 5: 'add Reading monthly' failed." in output.err
+
+def test_fast_entry_point_runs_plain_commands_without_click(capsys):
+    """Test that fastcli runs plain invocations itself and leaves options and bad input to click."""
+    import commands
+    import fastcli
+    assert commands.fast_command(["check-today", "Exercise"]) is commands.check_today
+    assert commands.fast_command(["check-today", "--help"]) is None
+    assert commands.fast_command(["add", "Exercise", "monthly"]) is None
+    assert commands.fast_command(["complete"]) is None
+
+    Habit("Exercise", "daily").save()
+    assert fastcli.main(["complete", "Exercise"]) == 0
+    assert fastcli.main(["--timing", "check-today", "Exercise"]) == 0
+    output = capsys.readouterr()
+    assert output.out == ("Habit 'Exercise' marked as completed for today.\n"
+                          "Habit 'Exercise' has already been completed today.\n")
+    assert output.err.startswith("Timing: imports")
+
+def test_generator_writes_reproducible_history(tmp_path):
+    """Test that the synthetic data generator honours its parameters and its seed."""
+    from generate_data import generate
+    first, second = str(tmp_path / "first.db"), str(tmp_path / "second.db")
+    written = generate(first, 10, days=70, weekly_share=0.3, rate=0.5, gaps='geometric', seed=7, chunk_size=50)
+    assert generate(second, 10, days=70, weekly_share=0.3, rate=0.5, gaps='geometric', seed=7) == written
+
+    with sqlite3.connect(first) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM habits WHERE periodicity = 'weekly'").fetchone()[0] == 3
+        assert conn.execute("SELECT SUM(completion_count) FROM habits").fetchone()[0] == written
+        days = conn.execute("SELECT habit_id, day FROM completion_days ORDER BY habit_id, day").fetchall()
+    with sqlite3.connect(second) as conn:
+        assert conn.execute("SELECT habit_id, day FROM completion_days ORDER BY habit_id, day").fetchall() == days
+    assert 0 < written < 7 * 70 + 3 * 10
+
+    # Days that already have a completion are skipped and not counted as written
+    full = generate(first, 0, days=70, rate=1.0, existing=True, chunk_size=50)
+    assert generate(first, 0, days=70, rate=1.0, existing=True) == 0
+    with sqlite3.connect(first) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM completion_days").fetchone()[0] == written + full
+
+def test_sql_statements_are_counted_and_slow_ones_logged(tmp_path, monkeypatch, sql_hooks):
+    """Test that the SQL hooks aggregate statements and write slow ones to the slow-query log."""
+    import sql_stats
+    log = tmp_path / "slow.log"
+    monkeypatch.setattr(sql_stats, "SLOW_QUERY_LOG", str(log))
+    monkeypatch.setattr(sql_stats, "SLOW_QUERY_MS", 0)
+    sql_stats.reset()
+
+    for name in ("Exercise", "Read a book"):
+        Habit(name, "daily").save()
+    get_all_habits()
+    get_all_habits()
+
+    entries = {entry["sql"]: entry for entry in sql_stats.snapshot()}
+    listing = entries["SELECT name, periodicity, created_at, streak FROM habits"]
+    assert (listing["calls"], listing["rows"], listing["params"]) == (2, 4, "tuple[0]")
+    assert any(sql.startswith("INSERT OR IGNORE INTO habits") and entry["rows"] == 2 for sql, entry in entries.items())
+    assert "SELECT name, periodicity, created_at, streak FROM habits" in log.read_text()
+
+def test_shipped_queries_do_not_scan_completions(sql_hooks):
+    """Test that no shipped statement or trigger plans a full scan of the completion history."""
+    import check_query_plans
+    results, uncovered = check_query_plans.check()
+
+    assert not [r["sql"] for r in results if isinstance(r["plan"], Exception)]
+    assert not [r["sql"] for r in results if r["scans"] and not r["allowed"]]
+    assert not uncovered
+
+def test_metrics_count_hot_paths_and_are_served_over_http(monkeypatch):
+    """Test that completions, streak recomputations and analytics latencies reach the Prometheus exposition."""
+    import urllib.request
+    import habit_tracker
+    import metrics
+    # complete_many refreshes streaks on the default engine; pin it to the one counted below
+    monkeypatch.setattr(habit_tracker, "STREAK_ENGINE", "python")
+    from habit_tracker import COMPLETIONS_WRITTEN, STREAK_RECOMPUTATIONS
+    from analytics import QUERY_SECONDS
+    metrics.reset()
+
+    habit = Habit("Exercise", "daily")
+    habit.save()
+    habit.complete_task()
+    habit.complete_task(date=datetime.now() - timedelta(days=3))
+    Habit.complete_many([("Exercise", datetime.now() - timedelta(days=1))])
+    Habit.update_all_streaks(engine="sql", full=True)
+    get_all_habits()
+
+    assert COMPLETIONS_WRITTEN.value() == 3
+    assert STREAK_RECOMPUTATIONS.value(kind="incremental", engine="python") == 1
+    assert STREAK_RECOMPUTATIONS.value(kind="full", engine="python") == 2
+    assert STREAK_RECOMPUTATIONS.value(kind="full", engine="sql") == 1
+    assert QUERY_SECONDS.count(query="get_all_habits") == 1
+
+    server = metrics.start_http_server(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/metrics"
+        with urllib.request.urlopen(url) as response:
+            assert response.headers["Content-Type"] == metrics.CONTENT_TYPE
+            body = response.read().decode("utf-8")
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert "habit_completions_written_total 3\n" in body
+    assert 'habit_analytics_query_seconds_bucket{query="get_all_habits",le="+Inf"} 1\n' in body
+    assert "# TYPE habit_db_open_connections gauge\n" in body
+
+def test_profile_and_trace_memory_options_report_to_stderr(tmp_path, capsys):
+    """Test that --profile and --trace-memory wrap setup and the command and report on stderr."""
+    import pstats
+    from cli import cli
+    Habit("Exercise", "daily").save()
+    output_file = str(tmp_path / "complete.prof")
+
+    args = ["--profile", "--profile-output", output_file, "--trace-memory", "complete", "Exercise"]
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main(args=args, prog_name="cli.py")
+    assert exit_info.value.code == 0
+
+    output = capsys.readouterr()
+    assert output.out == "Habit 'Exercise' marked as completed for today.\n"
+    assert f"Profile written to {output_file}" in output.err
+    assert "Ordered by: cumulative time" in output.err
+    assert "Memory: " in output.err and "peak" in output.err
+    functions = {name for _, _, name in pstats.Stats(output_file).stats}
+    assert {"update_all_streaks", "complete_task"} <= functions
+
+def test_habit_repository_serves_lookups_from_memory_and_tracks_writes(sql_hooks):
+    """Test that the repository caches habits, writes through, and reloads after outside changes."""
+    import sql_stats
+    from repository import HabitRepository
+    repository = HabitRepository()
+    assert repository.save(Habit("Meal prep", "weekly"))
+    assert not repository.save(Habit("Meal prep", "daily"))
+
+    sql_stats.reset()
+    habit = repository.get("Meal prep")
+    assert repository.get("Meal prep") is habit
+    assert not repository.exists("Missing") and not repository.exists("Missing")
+    # Only the first lookup of the unknown name reached the database
+    lookups = [entry["calls"] for entry in sql_stats.snapshot() if entry["sql"].startswith("SELECT name, periodicity")]
+    assert lookups == [1]
+    assert habit.periodicity == "weekly"
+
+    assert repository.complete_task(habit)
+    assert not repository.complete_task(habit, date=datetime.now() - timedelta(days=2))
+    assert repository.get("Meal prep").streak == 1
+
+    # A commit by another connection is picked up through PRAGMA data_version
+    with sqlite3.connect(DB_NAME) as other:
+        other.execute("UPDATE habits SET periodicity = 'daily' WHERE name = 'Meal prep'")
+    assert repository.get("Meal prep").periodicity == "daily"
+
+    # A write on the same connection that bypassed the repository is picked up too
+    Habit("Meal prep", "daily").delete()
+    assert repository.get("Meal prep") is None
+
+def test_complete_command_applies_the_weekly_rule():
+    """Test that the complete command uses the stored periodicity instead of assuming daily."""
+    import commands
+    Habit("Meal prep", "weekly").save()
+    Habit("Meal prep", "weekly").complete_task(date=datetime.now() - timedelta(days=2))
+
+    output = []
+    commands.complete("Meal prep", output.append)
+    assert output == ["Habit 'Meal prep' has already been completed within the last 7 days."]
+    with get_connection() as conn:
+        assert conn.execute("SELECT completion_count FROM habits WHERE name = 'Meal prep'").fetchone()[0] == 1
+
+def test_records_use_slots_and_build_from_rows():
+    """Test that Habit and Completion records have no per-instance __dict__ and load from stored rows."""
+    from analytics import get_completions
+    from habit_tracker import Completion
+    habit = Habit("Exercise", "daily")
+    habit.save()
+    now = datetime.now()
+    habit.complete_task(date=now - timedelta(days=1))
+    habit.complete_task()
+
+    with get_connection() as conn:
+        row = conn.execute("SELECT name, periodicity, created_at, streak, best_streak FROM habits").fetchone()
+        habit_id = conn.execute("SELECT id FROM habits").fetchone()[0]
+    loaded = Habit.from_row(row)
+    assert (loaded.name, loaded.periodicity, loaded.streak, loaded.best_streak) == ("Exercise", "daily", 2, 2)
+    assert loaded.created_at == habit.created_at.replace(microsecond=0)
+    assert not hasattr(loaded, "__dict__")
+
+    completions = get_completions("Exercise")
+    assert [(c.habit_id, c.date) for c in completions] == [(habit_id, (now - timedelta(days=1)).date()),
+                                                           (habit_id, now.date())]
+    assert not hasattr(completions[0], "__dict__")
+    assert completions[0] == Completion(habit_id, completions[0].day, completions[0].time)
+    assert get_completions("Missing") == []
+
+def test_completion_bitmap_matches_the_streak_fold():
+    """Test the bitmap operations and that its run state equals folding the completions in order."""
+    import random
+    from bitmaps import CompletionBitmap
+    from habit_tracker import EMPTY_RUN, advance_run
+    rng = random.Random(7)
+    for periodicity in ("daily", "weekly"):
+        for _ in range(50):
+            days = sorted(rng.sample(range(738000, 738400), rng.randrange(1, 120)))
+            expected = EMPTY_RUN
+            for day in days:
+                expected = advance_run(expected, day, periodicity)
+            bitmap = CompletionBitmap.from_days(reversed(days))
+            assert bitmap.run_state(periodicity) == expected
+            assert list(bitmap.days()) == days and bitmap.last_day == days[-1]
+            assert CompletionBitmap.from_blob(bitmap.first_day, *bitmap.to_blob()).bits == bitmap.bits
+
+    bitmap = CompletionBitmap.from_days([10, 12, 13])
+    bitmap.add(5)
+    assert (bitmap.first_day, bitmap.has(5), bitmap.has(6), bitmap.has(13)) == (5, True, False, True)
+    assert bitmap.count_between(0, 12) == 3 and bitmap.count_between(11, 20) == 2
+    assert bitmap.completion_rate(10, 14) == 0.4
+    assert CompletionBitmap().run_state("daily") == EMPTY_RUN
+
+def test_repository_answers_completion_checks_from_bitmaps(monkeypatch):
+    """Test that bitmap-backed checks match SQL and that stored bitmaps never go stale."""
+    import bitmaps
+    from analytics import completion_rate
+    import habit_tracker
+    from repository import HabitRepository
+    monkeypatch.setattr(bitmaps, "ENABLED", True)
+    # The bitmap engine would store bitmaps while complete_many refreshes streaks
+    monkeypatch.setattr(habit_tracker, "STREAK_ENGINE", "python")
+    now = datetime.now()
+    Habit("Exercise", "daily").save()
+    Habit.complete_many([("Exercise", now - timedelta(days=offset)) for offset in (1, 2, 4, 9)])
+
+    repository = HabitRepository()
+    habit = repository.get("Exercise")
+    assert not repository.is_completed_today(habit)
+    assert repository.is_completed_within_7_days(habit)
+    assert repository.completion_rate("Exercise", 5) == completion_rate("Exercise", 5) == 0.6
+    assert repository.completion_rate("Missing", 5) is None
+    # Reads keep the rebuilt bitmap in memory and write nothing
+    with get_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM completion_bitmaps").fetchone()[0] == 0
+
+    # Completing through the repository updates the mirror and the stored bitmap together
+    assert repository.complete_task(habit)
+    assert repository.is_completed_today(habit)
+    with get_connection() as conn:
+        habit_id = conn.execute("SELECT id FROM habits WHERE name = 'Exercise'").fetchone()[0]
+    assert bitmaps.read(get_connection(), habit_id).bits == repository.completion_bitmap("Exercise").bits
+
+    # Any other write to the completions drops the stored bitmap
+    with sqlite3.connect(DB_NAME) as other:
+        other.execute("DELETE FROM completion_days WHERE habit_id = ? AND day = ?", (habit_id, now.date().toordinal()))
+    assert bitmaps.read(get_connection(), habit_id) is None
+    assert not repository.is_completed_today(repository.get("Exercise"))
+
+def test_stored_bitmaps_include_completions_from_concurrent_writers(monkeypatch):
+    """Test that a completion committed by another writer mid-complete_task is in the stored bitmap."""
+    import bitmaps
+    import habit_tracker
+    from repository import HabitRepository
+    monkeypatch.setattr(bitmaps, "ENABLED", True)
+    Habit("Exercise", "daily").save()
+    repository = HabitRepository()
+    habit = repository.get("Exercise")
+    assert not repository.is_completed_today(habit)
+
+    complete_task = habit_tracker.Habit.complete_task
+    def complete_then_other_writer(self, date=None):
+        completed = complete_task(self, date)
+        _insert_completions("Exercise", [3])
+        return completed
+    monkeypatch.setattr(habit_tracker.Habit, "complete_task", complete_then_other_writer)
+    assert repository.complete_task(habit)
+
+    conn = get_connection()
+    habit_id = conn.execute("SELECT id FROM habits WHERE name = 'Exercise'").fetchone()[0]
+    assert bitmaps.read(conn, habit_id).bits == bitmaps.build(conn, habit_id).bits
+    assert repository.completion_rate("Exercise", 7) == 2 / 7
+
+    # The bitmap engine reads, rebuilds and stores under one write lock as well
+    Habit.update_all_streaks(engine="bitmap", full=True)
+    assert bitmaps.read(conn, habit_id).bits == bitmaps.build(conn, habit_id).bits